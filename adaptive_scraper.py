@@ -7,15 +7,23 @@ Automatically adjusts scraping frequency based on deal turnover analysis.
 import os
 import time
 import json
+import asyncio
 import logging
+import sqlite3
 import threading
 import argparse
+from collections import deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
-from deal_monitor import DealMonitor
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
+from database_monitor import DatabaseDealMonitor
 from main import GiftCardDealBot
-from config import config
+from scraper import get_cache_stats
 
 # Configure logging
 logging.basicConfig(
@@ -29,6 +37,33 @@ console = logging.StreamHandler()
 console.setLevel(logging.INFO)
 logger.addHandler(console)
 
+# Frequency adjustment rules, evaluated in order; the first match wins.
+# (turnover_above, turnover_below, lifetime_above, lifetime_below,
+#  delta_minutes, clamp_minutes, reason, confidence) — None means "no bound".
+FREQUENCY_RULES = (
+    (50, None, None, None, -15, 15, "very high turnover rate", "high"),
+    (30, None, None, None, -10, 30, "high turnover rate", "high"),
+    (None, 5, 180, None, 20, 120, "very low turnover and long deal lifetime", "high"),
+    (None, 10, None, None, 10, None, "low turnover rate", "medium"),
+    (None, None, None, 30, -10, None, "very short deal lifetime", "high"),
+)
+
+
+def _json_loads(data: bytes):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj, pretty: bool = False) -> bytes:
+    """Serialize an object to JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
+
 class AdaptiveScraper:
     """
     Adaptive scraper that automatically adjusts scraping frequency
@@ -38,54 +73,88 @@ class AdaptiveScraper:
     def __init__(self, initial_frequency_minutes: int = 60):
         """Initialize the adaptive scraper."""
         self.bot = GiftCardDealBot()
-        self.monitor = DealMonitor()
+        self.monitor = DatabaseDealMonitor()
         self.current_frequency = initial_frequency_minutes
         self.min_frequency = 10  # Minimum 10 minutes between scrapes
         self.max_frequency = 240  # Maximum 4 hours between scrapes
         self.adjustment_threshold = 5  # Number of scrapes before first adjustment
         self.scrape_count = 0
-        self.scrape_history = []
+        self.scrape_history = deque(maxlen=500)  # Only recent scrapes are kept in memory
         self.running = False
+        self._loop_task = None  # Parent task running both loops
         self.last_adjustment_time = None
-        self.adjustment_log_file = "frequency_adjustments.json"
-        self._load_adjustment_history()
+        self._last_adjustment_monotonic = None  # For elapsed-time checks, immune to clock changes
+        self.adjustment_db_file = "adjustments.db"
+        self.legacy_adjustment_log_file = "frequency_adjustments.json"  # History from before the database
+        self._db_lock = threading.Lock()  # Adjustments may be logged from worker threads
+        self._db = self._open_adjustment_db()
+
+    def _open_adjustment_db(self) -> sqlite3.Connection:
+        """Open the adjustment history database, creating the table if needed."""
+        con = sqlite3.connect(self.adjustment_db_file, isolation_level=None, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS adjustments (
+                ts TEXT,
+                old_freq INT,
+                new_freq INT,
+                reason TEXT,
+                confidence TEXT,
+                gcx_turnover REAL,
+                cc_turnover REAL,
+                avg_lifetime REAL,
+                scrape_count INT
+            )
+        """)
+        self._import_legacy_adjustments(con)
+        return con
+
+    def _import_legacy_adjustments(self, con: sqlite3.Connection):
+        """Copy the old JSON adjustment history into a new, empty adjustments table."""
+        if not os.path.exists(self.legacy_adjustment_log_file):
+            return
+        if con.execute("SELECT 1 FROM adjustments LIMIT 1").fetchone():
+            return  # Already imported, or history has been logged since
 
-    def _load_adjustment_history(self):
-        """Load previous frequency adjustment history."""
         try:
-            if os.path.exists(self.adjustment_log_file):
-                with open(self.adjustment_log_file, 'r') as f:
-                    self.adjustment_history = json.load(f)
-            else:
-                self.adjustment_history = {
-                    "adjustments": [],
-                    "stats": {
-                        "total_adjustments": 0,
-                        "increases": 0,
-                        "decreases": 0,
-                        "last_updated": datetime.now().isoformat()
-                    }
-                }
-        except Exception as e:
-            logger.error(f"Error loading adjustment history: {e}")
-            self.adjustment_history = {
-                "adjustments": [],
-                "stats": {
-                    "total_adjustments": 0,
-                    "increases": 0,
-                    "decreases": 0,
-                    "last_updated": datetime.now().isoformat()
-                }
-            }
+            with open(self.legacy_adjustment_log_file, 'rb') as f:
+                adjustments = _json_loads(f.read()).get("adjustments", [])
+            rows = [
+                (a["timestamp"], a["old_frequency"], a["new_frequency"], a["reason"], a["confidence"],
+                 a["metrics"].get("gcx_turnover", 0), a["metrics"].get("cardcash_turnover", 0),
+                 a["metrics"].get("avg_lifetime_minutes", 0), a["metrics"].get("scrape_count", 0))
+                for a in adjustments
+            ]
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.error(f"Error reading {self.legacy_adjustment_log_file}: {e}")
+            return
 
-    def _save_adjustment_history(self):
-        """Save frequency adjustment history to file."""
+        con.execute("BEGIN")
         try:
-            with open(self.adjustment_log_file, 'w') as f:
-                self.adjustment_history["stats"]["last_updated"] = datetime.now().isoformat()
-                json.dump(self.adjustment_history, f, indent=2)
-        except Exception as e:
-            logger.error(f"Error saving adjustment history: {e}")
+            con.executemany("INSERT INTO adjustments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            con.execute("COMMIT")
+        except sqlite3.Error as e:
+            con.execute("ROLLBACK")
+            logger.error(f"Error importing {self.legacy_adjustment_log_file}: {e}")
+            return
+        logger.info(f"Imported {len(rows)} adjustments from {self.legacy_adjustment_log_file}")
+
+    def get_adjustment_stats(self) -> Dict:
+        """Summarize the frequency adjustment history."""
+        with self._db_lock:
+            total, increases, decreases, last_updated = self._db.execute("""
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE new_freq < old_freq),
+                       COUNT(*) FILTER (WHERE new_freq >= old_freq),
+                       MAX(ts)
+                FROM adjustments
+            """).fetchone()
+        return {
+            "total_adjustments": total,
+            "increases": increases,
+            "decreases": decreases,
+            "last_updated": last_updated
+        }
 
     def set_frequency_bounds(self, min_minutes: int = 10, max_minutes: int = 240):
         """Set the minimum and maximum scraping frequency bounds."""
@@ -108,11 +177,11 @@ class AdaptiveScraper:
             try:
                 # Run a quick analysis (3 checks, 10 minutes apart)
                 logger.info("Running quick turnover analysis for frequency adjustment...")
-                session_data = self.monitor.run_monitoring_session(
+                session_id = self.monitor.run_monitoring_session(
                     duration_minutes=30, 
                     check_interval_minutes=10
                 )
-                turnover_data = self.monitor.analyze_session(session_data)
+                turnover_data = self.monitor.analyze_session(session_id)
             except Exception as e:
                 logger.error(f"Error running turnover analysis: {e}")
                 return
@@ -136,30 +205,22 @@ class AdaptiveScraper:
             
             # High turnover → more frequent scraping
             # Long lifetime → less frequent scraping
-            if avg_turnover > 50:  # Very high turnover (>50% changing)
-                self.current_frequency = max(self.min_frequency, min(15, self.current_frequency - 15))
-                confidence = "high"
-                reason = "very high turnover rate"
-            elif avg_turnover > 30:  # High turnover
-                self.current_frequency = max(self.min_frequency, min(30, self.current_frequency - 10))
-                confidence = "high"
-                reason = "high turnover rate"
-            elif avg_turnover < 5 and avg_lifetime > 180:  # Very low turnover and long lifetimes
-                self.current_frequency = min(self.max_frequency, max(120, self.current_frequency + 20))
-                confidence = "high"
-                reason = "very low turnover and long deal lifetime"
-            elif avg_turnover < 10:  # Low turnover
-                self.current_frequency = min(self.max_frequency, self.current_frequency + 10)
-                confidence = "medium"
-                reason = "low turnover rate"
-            elif avg_lifetime < 30:  # Very short-lived deals
-                self.current_frequency = max(self.min_frequency, self.current_frequency - 10)
-                confidence = "high" 
-                reason = "very short deal lifetime"
+            for (turnover_above, turnover_below, lifetime_above, lifetime_below,
+                    delta, clamp, reason, confidence) in FREQUENCY_RULES:
+                if ((turnover_above is None or avg_turnover > turnover_above) and
+                        (turnover_below is None or avg_turnover < turnover_below) and
+                        (lifetime_above is None or avg_lifetime > lifetime_above) and
+                        (lifetime_below is None or avg_lifetime < lifetime_below)):
+                    new_frequency = self.current_frequency + delta
+                    if clamp is not None:
+                        # Decreases are capped at the clamp, increases floored at it
+                        new_frequency = min(clamp, new_frequency) if delta < 0 else max(clamp, new_frequency)
+                    self.current_frequency = new_frequency
+                    break
             else:  # No significant change needed
                 confidence = "low"
                 reason = "metrics within normal range"
-                
+
             # Ensure frequency stays within bounds
             self.current_frequency = max(self.min_frequency, min(self.max_frequency, self.current_frequency))
             
@@ -171,140 +232,130 @@ class AdaptiveScraper:
                 logger.info(f"Frequency unchanged at {self.current_frequency}m ({reason})")
                 
             self.last_adjustment_time = datetime.now()
+            self._last_adjustment_monotonic = time.monotonic()
             
         except Exception as e:
             logger.error(f"Error during frequency adjustment: {e}")
 
     def _log_adjustment(self, old_freq: int, new_freq: int, reason: str, confidence: str, metrics: Dict):
         """Log frequency adjustment details."""
-        adjustment = {
-            "timestamp": datetime.now().isoformat(),
-            "old_frequency": old_freq,
-            "new_frequency": new_freq,
-            "reason": reason,
-            "confidence": confidence,
-            "metrics": {
-                "gcx_turnover": metrics.get("gcx_stats", {}).get("turnover_rate", 0),
-                "cardcash_turnover": metrics.get("cardcash_stats", {}).get("turnover_rate", 0),
-                "avg_lifetime_minutes": (
-                    metrics.get("gcx_stats", {}).get("avg_lifetime_minutes", 0) +
-                    metrics.get("cardcash_stats", {}).get("avg_lifetime_minutes", 0)
-                ) / 2,
-                "scrape_count": self.scrape_count
-            }
-        }
+        gcx_stats = metrics.get("gcx_stats", {})
+        cardcash_stats = metrics.get("cardcash_stats", {})
+        avg_lifetime = (
+            gcx_stats.get("avg_lifetime_minutes", 0) +
+            cardcash_stats.get("avg_lifetime_minutes", 0)
+        ) / 2
         
-        # Update statistics
-        self.adjustment_history["adjustments"].append(adjustment)
-        self.adjustment_history["stats"]["total_adjustments"] += 1
-        
-        if new_freq < old_freq:
-            self.adjustment_history["stats"]["increases"] += 1
-        else:
-            self.adjustment_history["stats"]["decreases"] += 1
-            
-        self._save_adjustment_history()
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT INTO adjustments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (datetime.now().isoformat(), old_freq, new_freq, reason, confidence,
+                     gcx_stats.get("turnover_rate", 0), cardcash_stats.get("turnover_rate", 0),
+                     avg_lifetime, self.scrape_count)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error logging frequency adjustment: {e}")
 
-    def _scraping_thread(self):
-        """Background thread that handles periodic scraping."""
+    async def _scraping_loop(self):
+        """Coroutine that handles periodic scraping."""
         while self.running:
             try:
                 start_time = datetime.now()
+                t0 = time.monotonic()
                 logger.info(f"Starting scheduled scrape (frequency: {self.current_frequency}m)")
-                
-                # Run the main bot scraping process
-                self.bot.process_deals()
+
+                # Run the main bot scraping process (sources are scraped concurrently)
+                await self.bot.process_deals_async()
                 
                 # Update scrape statistics
                 self.scrape_count += 1
                 self.scrape_history.append({
                     "timestamp": start_time.isoformat(),
-                    "duration_seconds": (datetime.now() - start_time).total_seconds(),
+                    "duration_seconds": time.monotonic() - t0,
                     "frequency_minutes": self.current_frequency
                 })
                 
                 # Periodically adjust frequency (every 4 scrapes after threshold)
                 if (self.scrape_count >= self.adjustment_threshold and
                         self.scrape_count % 4 == 0):
-                    self.adjust_frequency()
+                    await asyncio.to_thread(self.adjust_frequency)
                 
                 # Wait until next scheduled scrape
-                elapsed_seconds = (datetime.now() - start_time).total_seconds()
+                elapsed_seconds = time.monotonic() - t0
                 wait_seconds = max(0, (self.current_frequency * 60) - elapsed_seconds)
                 
                 logger.info(f"Scrape completed. Next scrape in {wait_seconds/60:.1f} minutes")
-                
-                # Check periodically if we should stop
-                wait_interval = 30  # Check every 30 seconds if we should stop
-                for _ in range(int(wait_seconds / wait_interval) + 1):
-                    if not self.running:
-                        break
-                    time.sleep(min(wait_interval, wait_seconds))
-                    wait_seconds -= wait_interval
+                await asyncio.sleep(wait_seconds)
                     
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error in scraping thread: {e}")
-                time.sleep(60)  # Wait a minute before retrying on error
+                logger.error(f"Error in scraping loop: {e}")
+                await asyncio.sleep(60)  # Wait a minute before retrying on error
 
-    def _monitoring_thread(self):
-        """Background thread that performs periodic turnover monitoring."""
+    async def _monitoring_loop(self):
+        """Coroutine that performs periodic turnover monitoring."""
         # Wait for initial scrapes to complete
-        time.sleep(self.current_frequency * 60 * 2)
+        await asyncio.sleep(self.current_frequency * 60 * 2)
         
         while self.running:
             try:
                 # Run monitoring session every 6 hours
-                if (not self.last_adjustment_time or 
-                    (datetime.now() - self.last_adjustment_time).total_seconds() / 3600 >= 6):
+                if (self._last_adjustment_monotonic is None or 
+                    (time.monotonic() - self._last_adjustment_monotonic) / 3600 >= 6):
                     
                     logger.info("Running comprehensive monitoring session...")
-                    session_data = self.monitor.run_monitoring_session(
+                    session_id = await self.monitor.run_monitoring_session_async(
                         duration_minutes=60,
                         check_interval_minutes=15
                     )
-                    turnover_data = self.monitor.analyze_session(session_data)
-                    self.adjust_frequency(turnover_data)
+                    turnover_data = await asyncio.to_thread(self.monitor.analyze_session, session_id)
+                    await asyncio.to_thread(self.adjust_frequency, turnover_data)
                 
                 # Sleep for 3 hours before checking again
-                for _ in range(36):  # Check every 5 minutes for 3 hours
-                    if not self.running:
-                        break
-                    time.sleep(300)  # 5 minutes
+                await asyncio.sleep(3 * 3600)
                     
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Error in monitoring thread: {e}")
-                time.sleep(1800)  # Wait 30 minutes before retrying on error
+                logger.error(f"Error in monitoring loop: {e}")
+                await asyncio.sleep(1800)  # Wait 30 minutes before retrying on error
+
+    async def _run(self):
+        """Run the scraping and monitoring loops side by side on the current event loop."""
+        try:
+            await asyncio.gather(self._scraping_loop(), self._monitoring_loop())
+        finally:
+            self.running = False
 
-    def start_adaptive_scraping(self):
-        """Start the adaptive scraping process."""
+    def start_adaptive_scraping(self) -> asyncio.Task:
+        """Start the adaptive scraping process on the running event loop."""
         if self.running:
             logger.warning("Adaptive scraper is already running")
-            return
+            return self._loop_task
             
         self.running = True
         logger.info(f"Starting adaptive scraper with initial frequency: {self.current_frequency}m")
         
-        # Create and start threads
-        self.scrape_thread = threading.Thread(target=self._scraping_thread)
-        self.scrape_thread.daemon = True
-        self.scrape_thread.start()
-        
-        self.monitor_thread = threading.Thread(target=self._monitoring_thread)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
+        self._loop_task = asyncio.create_task(self._run())
         
         logger.info("Adaptive scraper started successfully")
+        return self._loop_task
 
-    def stop_adaptive_scraping(self):
+    async def stop_adaptive_scraping(self):
         """Stop the adaptive scraping process."""
         logger.info("Stopping adaptive scraper...")
         self.running = False
         
-        # Wait for threads to terminate
-        if hasattr(self, 'scrape_thread') and self.scrape_thread.is_alive():
-            self.scrape_thread.join(timeout=60)
-        if hasattr(self, 'monitor_thread') and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=60)
+        # Cancelling the parent task cancels both loops wherever they are waiting
+        if self._loop_task is not None and not self._loop_task.done():
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+        self._loop_task = None
             
         logger.info("Adaptive scraper stopped")
         
@@ -318,9 +369,46 @@ class AdaptiveScraper:
             "min_frequency": self.min_frequency,
             "max_frequency": self.max_frequency,
             "adjustment_threshold": self.adjustment_threshold,
-            "latest_scrapes": self.scrape_history[-5:] if self.scrape_history else []
+            "cache_hit_ratio": get_cache_stats()['hit_ratio'],
+            "adjustment_stats": self.get_adjustment_stats(),
+            "latest_scrapes": list(self.scrape_history)[-5:]
         }
 
+async def async_main(args):
+    """Run the adaptive scraper until interrupted, reporting status every minute."""
+    # Create and configure adaptive scraper
+    scraper = AdaptiveScraper(initial_frequency_minutes=args.initial)
+    scraper.set_frequency_bounds(min_minutes=args.min, max_minutes=args.max)
+    scraper.adjustment_threshold = args.threshold
+    
+    # Start adaptive scraping
+    loop_task = scraper.start_adaptive_scraping()
+    
+    print("\nAdaptive scraper running. Press Ctrl+C to stop...\n")
+    try:
+        while not loop_task.done():
+            await asyncio.wait({loop_task}, timeout=60)
+            status = scraper.get_status()
+            print(f"\nStatus: Frequency={status['current_frequency_minutes']}m, Scrapes={status['scrape_count']}")
+        loop_task.result()
+    except asyncio.CancelledError:
+        print("\nStopping adaptive scraper...")
+        raise
+    except Exception as e:
+        logger.critical(f"Critical error in adaptive scraper: {e}")
+    finally:
+        await scraper.stop_adaptive_scraping()
+
+def pretty_print(path: str):
+    """Print each row of the adjustments database as indented JSON, for human inspection."""
+    con = sqlite3.connect(path)
+    con.row_factory = sqlite3.Row
+    try:
+        for row in con.execute("SELECT * FROM adjustments ORDER BY ts"):
+            print(_json_dumps(dict(row), pretty=True).decode())
+    finally:
+        con.close()
+
 def main():
     """Main entry point for the adaptive scraper."""
     parser = argparse.ArgumentParser(description="Adaptive Scraper for Telegram Deal Bot")
@@ -329,36 +417,24 @@ def main():
     parser.add_argument("--initial", type=int, default=60, help="Initial scraping frequency in minutes (default: 60)")
     parser.add_argument("--threshold", type=int, default=5, help="Adjustment threshold - scrapes before first adjustment (default: 5)")
     
+    subparsers = parser.add_subparsers(dest="command")
+    pretty_parser = subparsers.add_parser("pretty-print", help="Print the adjustment history as indented JSON")
+    pretty_parser.add_argument("path", nargs="?", default="adjustments.db",
+                               help="Path to the adjustments database (default: adjustments.db)")
+    
     args = parser.parse_args()
     
+    if args.command == "pretty-print":
+        pretty_print(args.path)
+        return
+    
     # Ensure logs directory exists
     os.makedirs("logs", exist_ok=True)
     
     try:
-        # Create and configure adaptive scraper
-        scraper = AdaptiveScraper(initial_frequency_minutes=args.initial)
-        scraper.set_frequency_bounds(min_minutes=args.min, max_minutes=args.max)
-        scraper.adjustment_threshold = args.threshold
-        
-        # Start adaptive scraping
-        scraper.start_adaptive_scraping()
-        
-        # Keep main thread alive for keyboard interrupt
-        print("\nAdaptive scraper running. Press Ctrl+C to stop...\n")
-        while True:
-            time.sleep(60)
-            status = scraper.get_status()
-            print(f"\nStatus: Frequency={status['current_frequency_minutes']}m, Scrapes={status['scrape_count']}")
-            
+        asyncio.run(async_main(args))
     except KeyboardInterrupt:
-        print("\nStopping adaptive scraper...")
-        if 'scraper' in locals():
-            scraper.stop_adaptive_scraping()
         print("Stopped.")
-    except Exception as e:
-        logger.critical(f"Critical error in adaptive scraper: {e}")
-        if 'scraper' in locals():
-            scraper.stop_adaptive_scraping()
 
 if __name__ == "__main__":
     main()
@@ -5,9 +5,14 @@ Provides an endpoint that can be pinged by external cron services to trigger the
 """
 
 import os
-from flask import Flask, jsonify
-from main import GiftCardDealBot
+import json
+import time
+import uuid
+import fcntl
 import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, jsonify
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,6 +20,29 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Bot runs happen in the background so /trigger returns immediately
+executor = ThreadPoolExecutor(max_workers=2)
+
+# Single-flight guard shared by every WSGI worker process: an exclusive flock
+# on this file is held for the duration of a run, and the file records the
+# most recent job so any worker can coalesce triggers and report status.
+RUN_STATE_FILE = os.environ.get(
+    'RUN_STATE_FILE', os.path.join(tempfile.gettempdir(), 'giftcard_bot_run.json')
+)
+
+# Triggers arriving this soon after the previous run started are coalesced into it
+MIN_TRIGGER_INTERVAL_SECONDS = int(os.environ.get('MIN_TRIGGER_INTERVAL_SECONDS', 60))
+
+# The environment doesn't change in-process, so resolve /health's view of it once
+_CONFIG_STATUS = {
+    'telegram_bot_token': bool(os.getenv('TELEGRAM_BOT_TOKEN')),
+    'telegram_channel_id': bool(os.getenv('TELEGRAM_CHANNEL_ID')),
+    'geniuslink_api_key': bool(os.getenv('GENIUSLINK_API_KEY')),
+    'supabase_url': bool(os.getenv('SUPABASE_URL')),
+    'supabase_key': bool(os.getenv('SUPABASE_ANON_KEY'))
+}
+_ALL_CONFIGURED = all(_CONFIG_STATUS.values())
+
 @app.route('/')
 def home():
     """Health check endpoint"""
@@ -24,6 +52,7 @@ def home():
         'endpoints': {
             '/': 'Health check',
             '/trigger': 'Trigger bot execution',
+            '/trigger/<job_id>': 'Status of a triggered bot execution',
             '/health': 'Detailed health check'
         }
     })
@@ -31,43 +60,113 @@ def home():
 @app.route('/health')
 def health():
     """Detailed health check with configuration status"""
-    config_status = {
-        'telegram_bot_token': bool(os.getenv('TELEGRAM_BOT_TOKEN')),
-        'telegram_channel_id': bool(os.getenv('TELEGRAM_CHANNEL_ID')),
-        'geniuslink_api_key': bool(os.getenv('GENIUSLINK_API_KEY')),
-        'supabase_url': bool(os.getenv('SUPABASE_URL')),
-        'supabase_key': bool(os.getenv('SUPABASE_ANON_KEY'))
-    }
-    
-    all_configured = all(config_status.values())
-    
     return jsonify({
-        'status': 'healthy' if all_configured else 'partially_configured',
-        'configuration': config_status,
-        'ready_to_run': all_configured
+        'status': 'healthy' if _ALL_CONFIGURED else 'partially_configured',
+        'configuration': _CONFIG_STATUS,
+        'ready_to_run': _ALL_CONFIGURED
     })
 
-@app.route('/trigger')
-def trigger_bot():
-    """Trigger the bot to check for deals and post to Telegram"""
+def _acquire_run_lock():
+    """Take the cross-process run lock without blocking; returns the fd or None"""
+    fd = os.open(RUN_STATE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
     try:
-        logger.info("Bot execution triggered via web endpoint")
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+def _release_run_lock(fd: int):
+    """Release the cross-process run lock"""
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+def _read_run_state() -> dict:
+    """Read the most recent run's state (job id, start time, status)"""
+    try:
+        with open(RUN_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _write_run_state(fd: int, state: dict):
+    """Overwrite the run state; only called while holding the run lock"""
+    data = json.dumps(state).encode()
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, data, 0)
+
+def _run_bot(fd: int, state: dict):
+    """Run the bot in a worker thread and record the outcome for the job"""
+    try:
+        # Imported lazily so health checks don't load the bot configuration
+        from main import GiftCardDealBot
+        _write_run_state(fd, {**state, 'status': 'running'})
         bot = GiftCardDealBot()
         bot.process_deals()
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Bot execution completed successfully'
-        })
-    
+        _write_run_state(fd, {**state, 'status': 'success'})
     except Exception as e:
         logger.error(f"Error during bot execution: {e}")
+        _write_run_state(fd, {**state, 'status': f'error: {e}'})
+    finally:
+        _release_run_lock(fd)
+
+@app.route('/trigger')
+def trigger_bot():
+    """Trigger the bot to check for deals and post to Telegram in the background"""
+    # Only one run may be queued or in progress at a time, across all workers
+    fd = _acquire_run_lock()
+    if fd is None:
+        return jsonify({
+            'status': 'busy',
+            'message': 'Bot execution already in progress',
+            'job_id': _read_run_state().get('job_id')
+        }), 429
+
+    try:
+        last_run = _read_run_state()
+        started_at = last_run.get('started_at')
+        if started_at is not None and time.time() - started_at < MIN_TRIGGER_INTERVAL_SECONDS:
+            _release_run_lock(fd)
+            return jsonify({
+                'status': 'skipped',
+                'message': 'Bot execution ran recently',
+                'job_id': last_run.get('job_id')
+            })
+
+        state = {'job_id': uuid.uuid4().hex, 'started_at': time.time()}
+        _write_run_state(fd, {**state, 'status': 'queued'})
+        executor.submit(_run_bot, fd, state)
+        logger.info(f"Bot execution triggered via web endpoint (job {state['job_id']})")
+    except Exception as e:
+        _release_run_lock(fd)
+        logger.error(f"Error scheduling bot execution: {e}")
         return jsonify({
             'status': 'error',
             'message': f'Bot execution failed: {str(e)}'
         }), 500
 
+    return jsonify({
+        'status': 'accepted',
+        'job_id': state['job_id']
+    }), 202
+
+@app.route('/trigger/<job_id>')
+def trigger_status(job_id):
+    """Report the status of the most recently triggered bot run"""
+    state = _read_run_state()
+    if state.get('job_id') != job_id:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown job id: {job_id}'
+        }), 404
+
+    return jsonify({
+        'job_id': job_id,
+        'status': state.get('status')
+    })
+
 if __name__ == '__main__':
-    # For local development
+    # For local development only; in production run under gunicorn:
+    #   gunicorn -w 2 -k gthread --threads 4 -b 0.0.0.0:$PORT app:app
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Minimal Bloom filter used to skip database lookups for deals that were never posted
+"""
+
+import os
+import json
+import math
+import mmap
+import tempfile
+from typing import Dict, Optional
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter keyed by hex digest strings.
+
+    Keys are already uniformly distributed hashes, so bit positions are derived
+    from the two halves of the digest (double hashing) instead of re-hashing.
+    A negative answer is definitive; a positive answer may be a false positive.
+    """
+
+    def __init__(self, capacity: int = 100_000, error_rate: float = 0.001):
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        half = len(key) // 2
+        h1 = int(key[:half], 16)
+        h2 = int(key[half:], 16) | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str):
+        """Add a hex digest to the filter"""
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path: str, meta: Dict):
+        """Atomically write the filter and caller metadata to path (a JSON header line, then the raw bits)"""
+        header = {**meta, 'num_bits': self.num_bits, 'num_hashes': self.num_hashes}
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.bloom-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(header).encode() + b'\n')
+                f.write(self._bits)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> Optional[Dict]:
+        """
+        Replace the bits with those saved at path and return the saved metadata.
+        Returns None (leaving the filter untouched) if the file is missing, truncated,
+        or was built with a different size or hash count.
+        """
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                header = json.loads(m.readline())
+                if header.get('num_bits') != self.num_bits or header.get('num_hashes') != self.num_hashes:
+                    return None
+                if len(m) - m.tell() != len(self._bits):
+                    return None
+                self._bits = bytearray(m[m.tell():])
+        except (OSError, ValueError):
+            return None
+        return header
@@ -6,25 +6,24 @@ Loads environment variables from a .env file and provides them as a dataclass.
 
 import os
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load .env file
-load_dotenv()
-
 logger = logging.getLogger(__name__)
 
 @dataclass
 class Config:
     """A dataclass to hold all configuration variables from environment variables."""
-    telegram_bot_token: str = os.getenv('TELEGRAM_BOT_TOKEN')
-    telegram_channel_id: str = os.getenv('TELEGRAM_CHANNEL_ID')
-    telegram_premium_channel_id: str = os.getenv('TELEGRAM_PREMIUM_CHANNEL_ID')
-    geniuslink_api_key: str = os.getenv('GENIUSLINK_API_KEY')
-    geniuslink_secret: str = os.getenv('GENIUSLINK_SECRET')
-    supabase_url: str = os.getenv('SUPABASE_URL')
-    supabase_key: str = os.getenv('SUPABASE_ANON_KEY')
-    scrapingdog_api_key: str = os.getenv('SCRAPINGDOG_API_KEY')
+    telegram_bot_token: str = field(default_factory=lambda: os.getenv('TELEGRAM_BOT_TOKEN'))
+    telegram_channel_id: str = field(default_factory=lambda: os.getenv('TELEGRAM_CHANNEL_ID'))
+    telegram_premium_channel_id: str = field(default_factory=lambda: os.getenv('TELEGRAM_PREMIUM_CHANNEL_ID'))
+    geniuslink_api_key: str = field(default_factory=lambda: os.getenv('GENIUSLINK_API_KEY'))
+    geniuslink_secret: str = field(default_factory=lambda: os.getenv('GENIUSLINK_SECRET'))
+    supabase_url: str = field(default_factory=lambda: os.getenv('SUPABASE_URL'))
+    supabase_key: str = field(default_factory=lambda: os.getenv('SUPABASE_ANON_KEY'))
+    scrapingdog_api_key: str = field(default_factory=lambda: os.getenv('SCRAPINGDOG_API_KEY'))
+    telegram_concurrency: int = field(default_factory=lambda: int(os.getenv('TELEGRAM_CONCURRENCY', '4')))
 
     def __post_init__(self):
         """Validate that essential variables are set."""
@@ -39,5 +38,10 @@ class Config:
         if not self.scrapingdog_api_key:
             logger.warning("SCRAPINGDOG_API_KEY is not set. Scraping will not work.")
 
-# Create a single instance of the config to be imported by other modules
-config = Config()
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Load the configuration once and return the shared instance."""
+    # Hosted deployments inject secrets directly, so skip the .env disk read there
+    if not os.getenv('REPLIT_DEPLOYMENT'):
+        load_dotenv()
+    return Config()
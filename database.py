@@ -5,51 +5,225 @@ Handles Supabase integration for duplicate checking and deal storage
 """
 
 import os
+import atexit
 import hashlib
 import logging
-from datetime import datetime, timezone
-from typing import List, Dict, Optional, Set
-from supabase import create_client, Client
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from datetime import datetime, timezone, timedelta
+from typing import Iterator, List, Dict, Optional, Set
+import xxhash
+from supabase import Client
 
-from config import config
+from bloom_filter import BloomFilter
+from config import get_config
+from db_client import get_supabase, iter_rows
 
 logger = logging.getLogger(__name__)
 
+SEEN_CACHE_SIZE = 10_000  # Confirmed posted hashes kept in memory
+BLOOM_WARM_HOURS = 24 * 7  # Matches the cleanup_old_deals retention window
+# Re-read this much before the watermark: rows committed late by another process
+# (posted_at is stamped before the upsert lands) would otherwise fall behind it
+BLOOM_SYNC_OVERLAP = timedelta(minutes=5)
+# The bloom filter is saved here at exit so the next cron run starts warm
+BLOOM_STATE_FILE = os.environ.get(
+    'BLOOM_STATE_FILE', os.path.join(tempfile.gettempdir(), 'giftcard_posted_bloom.bin')
+)
+# Rows posted before the switch to xxh3 carry MD5 hashes of the same key. Until they
+# age out of the 7-day retention window, duplicate checks look up both digests
+LEGACY_HASH_UNTIL = datetime.fromisoformat(
+    os.environ.get('LEGACY_HASH_UNTIL', '2026-10-29T00:00:00+00:00')
+)
+RECENT_DEAL_COLUMNS = 'merchant,face_value,price,discount_percent,url,source,posted_at'
+
+def _cutoff(**delta) -> datetime:
+    """UTC time `delta` ago, floored to the minute so queries within a minute share one value"""
+    return (datetime.now(timezone.utc) - timedelta(**delta)).replace(second=0, microsecond=0)
+
+@lru_cache(maxsize=8192)
+def _hash_deal_key(merchant: str, discount: float, source: str, face_value) -> str:
+    """Hash a deal's identifying fields (cached, as the same deal is hashed at several stages)"""
+    # Create a unique identifier based on merchant, discount, and source
+    deal_key = f"{merchant}_{discount:.1f}_{source}_{face_value}"
+    # Non-cryptographic 64-bit hash: much cheaper than MD5 and ample for deduplication
+    return xxhash.xxh3_64_hexdigest(deal_key)
+
+@lru_cache(maxsize=8192)
+def _legacy_hash_deal_key(merchant: str, discount: float, source: str, face_value) -> str:
+    """MD5 of the same key, as stored before the xxh3 switch (see LEGACY_HASH_UNTIL)"""
+    deal_key = f"{merchant}_{discount:.1f}_{source}_{face_value}"
+    return hashlib.md5(deal_key.encode()).hexdigest()
+
+def _posted_deal_record(deal: Dict, deal_hash: str, posted_at: str) -> Dict:
+    """Build a posted_deals row for a deal"""
+    return {
+        'deal_hash': deal_hash,
+        'merchant': deal['merchant'],
+        'face_value': float(deal['face_value']),
+        'price': float(deal['price']),
+        'discount_percent': float(deal['discount_percent']),
+        'url': deal.get('url', ''),
+        'source': deal['source'],
+        'posted_at': posted_at
+    }
+
 class DealDatabase:
     def __init__(self):
         """Initialize Supabase client"""
+        config = get_config()
         self.supabase_url = config.supabase_url
         self.supabase_key = config.supabase_key
         
-        if self.supabase_url and self.supabase_key:
-            self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-            logger.info("Supabase client initialized successfully")
-        else:
-            logger.warning("Supabase credentials not found. Database operations will be disabled.")
-            self.supabase = None
+        # Shared, pooled client (None when credentials are missing)
+        self.supabase: Optional[Client] = get_supabase()
+        
+        # Posted-hash caches in front of Supabase: a bloom filter answers "never posted"
+        # without a round-trip, and a bounded LRU remembers confirmed posts (hash -> posted_at)
+        self._bloom = BloomFilter(capacity=100_000, error_rate=0.001)
+        self._seen_lru = OrderedDict()
+        self._bloom_synced_at = None
+        self._bloom_created_at = datetime.now(timezone.utc)
+        self._load_bloom_state()
+        atexit.register(self._save_bloom_state)
     
     def generate_deal_hash(self, deal: Dict) -> str:
         """Generate a unique hash for a deal to prevent duplicates"""
-        # Create a unique identifier based on merchant, discount, and source
-        deal_key = f"{deal['merchant']}_{deal['discount_percent']:.1f}_{deal['source']}_{deal.get('face_value', 0)}"
-        return hashlib.md5(deal_key.encode()).hexdigest()
+        # Rounding first keeps the cache key stable across float drift
+        return _hash_deal_key(deal['merchant'], round(deal['discount_percent'], 1), deal['source'], deal.get('face_value', 0))
     
-    def is_deal_posted(self, deal: Dict) -> bool:
-        """Check if a deal has already been posted"""
+    def _lookup_hashes(self, deal: Dict) -> tuple:
+        """Hashes a posted copy of this deal may be stored under (the current one first)"""
+        deal_hash = self.generate_deal_hash(deal)
+        if datetime.now(timezone.utc) >= LEGACY_HASH_UNTIL:
+            return (deal_hash,)
+        legacy_hash = _legacy_hash_deal_key(
+            deal['merchant'], round(deal['discount_percent'], 1), deal['source'], deal.get('face_value', 0)
+        )
+        return (deal_hash, legacy_hash)
+    
+    def _remember_posted(self, deal_hash: str, posted_at: datetime):
+        """Record a posted deal in the bloom filter and the recently-seen LRU"""
+        self._bloom.add(deal_hash)
+        previous = self._seen_lru.get(deal_hash)
+        self._seen_lru[deal_hash] = max(previous, posted_at) if previous else posted_at
+        self._seen_lru.move_to_end(deal_hash)
+        if len(self._seen_lru) > SEEN_CACHE_SIZE:
+            self._seen_lru.popitem(last=False)
+    
+    def _load_bloom_state(self):
+        """Start from the filter a previous run saved, so only newer posts need syncing"""
+        meta = self._bloom.load(BLOOM_STATE_FILE)
+        if not meta:
+            return
+        
+        try:
+            created_at = datetime.fromisoformat(meta['created_at'])
+            synced_at = datetime.fromisoformat(meta['synced_at'])
+        except (KeyError, TypeError, ValueError):
+            created_at = None
+        
+        # Hashes of cleaned-up deals never leave a bloom filter, so rebuild it once a retention window
+        if created_at is None or datetime.now(timezone.utc) - created_at > timedelta(hours=BLOOM_WARM_HOURS):
+            self._bloom = BloomFilter(capacity=100_000, error_rate=0.001)
+            return
+        
+        self._bloom_created_at = created_at
+        self._bloom_synced_at = synced_at
+        logger.info("Loaded posted deal bloom filter synced at %s", synced_at.isoformat())
+    
+    def _save_bloom_state(self):
+        """
+        Save the filter with its sync watermark. Its bits cover every post up to
+        synced_at plus this process's own posts, so the next run only syncs from there.
+        """
+        if self._bloom_synced_at is None:
+            return
+        try:
+            self._bloom.save(BLOOM_STATE_FILE, {
+                'created_at': self._bloom_created_at.isoformat(),
+                'synced_at': self._bloom_synced_at.isoformat()
+            })
+        except OSError as e:
+            logger.error("Error saving posted deal bloom filter: %s", e)
+    
+    def _sync_bloom(self) -> bool:
+        """
+        Add hashes posted since the last sync (the first sync warms the filter).
+        Returns whether the filter is now current enough to rule deals out.
+        """
+        if self._bloom_synced_at is None:
+            since = datetime.now(timezone.utc) - timedelta(hours=BLOOM_WARM_HOURS)
+        else:
+            since = self._bloom_synced_at - BLOOM_SYNC_OVERLAP
+        synced_at = datetime.now(timezone.utc)
+        try:
+            for deal_hash in self._iter_hashes(since.isoformat()):
+                self._bloom.add(deal_hash)
+        except Exception as e:
+            # A stale filter can't rule anything out: other processes may have posted since
+            logger.error("Error syncing posted deal bloom filter: %s", e)
+            return False
+        
+        self._bloom_synced_at = synced_at
+        return True
+    
+    def are_deals_posted(self, deals: List[Dict], hours_back: Optional[int] = None) -> Set[str]:
+        """Return the current hashes of the given deals that have already been posted (one query)"""
         if not self.supabase:
             logger.warning("Supabase not available, skipping duplicate check")
-            return False
+            return set()
         
-        try:
+        # Every check syncs from the watermark (cheap: only newer rows are read), so a
+        # deal another process posted since the last check is never ruled out
+        bloom_ready = self._sync_bloom()
+        
+        cutoff_time = _cutoff(hours=hours_back) if hours_back is not None else None
+        
+        posted_hashes = set()
+        unknown_hashes = {}  # stored hash to look up -> the deal's current hash
+        for deal in deals:
             deal_hash = self.generate_deal_hash(deal)
+            for lookup_hash in self._lookup_hashes(deal):
+                if bloom_ready and lookup_hash not in self._bloom:
+                    continue  # Definitely never posted under this hash
+                posted_at = self._seen_lru.get(lookup_hash)
+                if posted_at and (cutoff_time is None or posted_at >= cutoff_time):
+                    self._seen_lru.move_to_end(lookup_hash)
+                    posted_hashes.add(deal_hash)
+                    break
+                unknown_hashes[lookup_hash] = deal_hash
+        
+        if not unknown_hashes:
+            return posted_hashes
+        
+        try:
+            # Only "maybe posted" hashes reach the database, in a single RPC (see database_setup.sql)
+            response = self.supabase.rpc('posted_deal_hashes_hit', {
+                'hs': list(unknown_hashes),
+                'since': cutoff_time.isoformat() if cutoff_time is not None else None
+            }).execute()
             
-            response = self.supabase.table('posted_deals').select('id').eq('deal_hash', deal_hash).execute()
-            
-            return len(response.data) > 0
+            for row in response.data:
+                self._remember_posted(row['deal_hash'], datetime.fromisoformat(row['posted_at']))
+                posted_hashes.add(unknown_hashes[row['deal_hash']])
             
         except Exception as e:
-            logger.error(f"Error checking if deal is posted: {e}")
-            return False
+            logger.error("Error checking if deals are posted: %s", e)
+        
+        return posted_hashes
+    
+    def is_deal_posted(self, deal: Dict) -> bool:
+        """Check if a deal has already been posted"""
+        return self.generate_deal_hash(deal) in self.are_deals_posted([deal])
+    
+    def _iter_hashes(self, since: str) -> Iterator[str]:
+        """Yield the hashes of deals posted since an ISO timestamp, one page at a time"""
+        rows = iter_rows(
+            lambda: self.supabase.table('posted_deals').select('deal_hash').gte('posted_at', since).order('id')
+        )
+        return (row['deal_hash'] for row in rows)
     
     def get_posted_deal_hashes(self, hours_back: int = 24) -> Set[str]:
         """Get all deal hashes posted in the last N hours"""
@@ -58,49 +232,55 @@ class DealDatabase:
         
         try:
             # Calculate timestamp for N hours ago
-            from datetime import timedelta
-            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
-            
-            response = self.supabase.table('posted_deals').select('deal_hash').gte('posted_at', cutoff_time.isoformat()).execute()
+            cutoff_time = _cutoff(hours=hours_back)
             
-            return {row['deal_hash'] for row in response.data}
+            return set(self._iter_hashes(cutoff_time.isoformat()))
             
         except Exception as e:
-            logger.error(f"Error getting posted deal hashes: {e}")
+            logger.error("Error getting posted deal hashes: %s", e)
             return set()
     
-    def mark_deal_as_posted(self, deal: Dict) -> bool:
-        """Mark a deal as posted to prevent duplicates"""
+    def mark_deals_as_posted(self, deals: List[Dict]) -> int:
+        """Mark a batch of deals as posted in a single request; returns the number stored"""
         if not self.supabase:
             logger.warning("Supabase not available, skipping deal storage")
-            return False
+            return 0
+        
+        if not deals:
+            return 0
         
         try:
-            deal_hash = self.generate_deal_hash(deal)
+            posted_at = datetime.now(timezone.utc).isoformat()
             
-            deal_record = {
-                'deal_hash': deal_hash,
-                'merchant': deal['merchant'],
-                'face_value': float(deal['face_value']),
-                'price': float(deal['price']),
-                'discount_percent': float(deal['discount_percent']),
-                'url': deal.get('url', ''),
-                'source': deal['source'],
-                'posted_at': datetime.now(timezone.utc).isoformat()
+            # Keyed by hash: a statement can't upsert the same row twice
+            deal_records = {
+                self.generate_deal_hash(deal): _posted_deal_record(deal, self.generate_deal_hash(deal), posted_at)
+                for deal in deals
             }
             
-            response = self.supabase.table('posted_deals').insert(deal_record).execute()
+            # Upsert so a deal reposted after the duplicate window refreshes its
+            # posted_at instead of failing the whole batch on the unique hash
+            response = self.supabase.table('posted_deals').upsert(
+                list(deal_records.values()), on_conflict='deal_hash'
+            ).execute()
             
             if response.data:
-                logger.info(f"Deal marked as posted: {deal['merchant']} ({deal['discount_percent']:.1f}% off)")
-                return True
+                posted_time = datetime.fromisoformat(posted_at)
+                for row in response.data:
+                    self._remember_posted(row['deal_hash'], posted_time)
+                logger.info("Deals marked as posted: %s", len(response.data))
+                return len(response.data)
             else:
-                logger.error("Failed to mark deal as posted - no data returned")
-                return False
+                logger.error("Failed to mark deals as posted - no data returned")
+                return 0
                 
         except Exception as e:
-            logger.error(f"Error marking deal as posted: {e}")
-            return False
+            logger.error("Error marking deals as posted: %s", e)
+            return 0
+    
+    def mark_deal_as_posted(self, deal: Dict) -> bool:
+        """Mark a deal as posted to prevent duplicates"""
+        return self.mark_deals_as_posted([deal]) == 1
     
     def filter_new_deals(self, deals: List[Dict]) -> List[Dict]:
         """Filter out deals that have already been posted"""
@@ -109,22 +289,25 @@ class DealDatabase:
             return deals
         
         try:
-            # Get all posted deal hashes from the last 24 hours
-            posted_hashes = self.get_posted_deal_hashes(hours_back=24)
-            
-            new_deals = []
-            for deal in deals:
-                deal_hash = self.generate_deal_hash(deal)
-                if deal_hash not in posted_hashes:
-                    new_deals.append(deal)
-                else:
-                    logger.debug(f"Skipping duplicate deal: {deal['merchant']} ({deal['discount_percent']:.1f}% off)")
-            
-            logger.info(f"Filtered {len(deals)} deals down to {len(new_deals)} new deals")
+            # Look up only these deals' hashes among those posted in the last 24 hours
+            posted_hashes = self.are_deals_posted(deals, hours_back=24)
+            
+            if not posted_hashes:
+                new_deals = list(deals)
+            else:
+                new_deals = [deal for deal in deals if self.generate_deal_hash(deal) not in posted_hashes]
+                
+                # Only walk the duplicates when someone is listening
+                if logger.isEnabledFor(logging.DEBUG):
+                    for deal in deals:
+                        if self.generate_deal_hash(deal) in posted_hashes:
+                            logger.debug("Skipping duplicate deal: %s (%.1f%% off)", deal['merchant'], deal['discount_percent'])
+            
+            logger.info("Filtered %s deals down to %s new deals", len(deals), len(new_deals))
             return new_deals
             
         except Exception as e:
-            logger.error(f"Error filtering new deals: {e}")
+            logger.error("Error filtering new deals: %s", e)
             return deals  # Return all deals if filtering fails
     
     def log_bot_execution(self, deals_found: int, deals_posted: int, premium_deals_posted: int = 0, errors: str = None, status: str = 'success') -> bool:
@@ -145,14 +328,14 @@ class DealDatabase:
             response = self.supabase.table('bot_executions').insert(execution_record).execute()
             
             if response.data:
-                logger.info(f"Bot execution logged: {deals_found} found, {deals_posted} posted")
+                logger.info("Bot execution logged: %s found, %s posted", deals_found, deals_posted)
                 return True
             else:
                 logger.error("Failed to log bot execution")
                 return False
                 
         except Exception as e:
-            logger.error(f"Error logging bot execution: {e}")
+            logger.error("Error logging bot execution: %s", e)
             return False
     
     def update_merchant_stats(self, deal: Dict) -> bool:
@@ -161,40 +344,16 @@ class DealDatabase:
             return False
         
         try:
-            merchant = deal['merchant']
-            discount = float(deal['discount_percent'])
-            
-            # Check if merchant exists
-            response = self.supabase.table('merchant_stats').select('*').eq('merchant', merchant).execute()
-            
-            if response.data:
-                # Update existing merchant
-                existing = response.data[0]
-                new_total = existing['total_deals'] + 1
-                new_avg = ((existing['avg_discount'] * existing['total_deals']) + discount) / new_total
-                
-                update_data = {
-                    'total_deals': new_total,
-                    'avg_discount': round(new_avg, 2),
-                    'last_seen': datetime.now(timezone.utc).isoformat()
-                }
-                
-                self.supabase.table('merchant_stats').update(update_data).eq('merchant', merchant).execute()
-            else:
-                # Create new merchant record
-                new_record = {
-                    'merchant': merchant,
-                    'total_deals': 1,
-                    'avg_discount': discount,
-                    'last_seen': datetime.now(timezone.utc).isoformat()
-                }
-                
-                self.supabase.table('merchant_stats').insert(new_record).execute()
+            # Running average is updated server-side in one atomic upsert (see database_setup.sql)
+            self.supabase.rpc('upsert_merchant_stat', {
+                'm': deal['merchant'],
+                'd': float(deal['discount_percent'])
+            }).execute()
             
             return True
             
         except Exception as e:
-            logger.error(f"Error updating merchant stats: {e}")
+            logger.error("Error updating merchant stats: %s", e)
             return False
     
     def get_recent_deals(self, hours_back: int = 24, min_discount: float = 15.0) -> List[Dict]:
@@ -203,15 +362,14 @@ class DealDatabase:
             return []
         
         try:
-            from datetime import timedelta
-            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+            cutoff_time = _cutoff(hours=hours_back)
             
-            response = self.supabase.table('posted_deals').select('*').gte('posted_at', cutoff_time.isoformat()).gte('discount_percent', min_discount).order('posted_at', desc=True).execute()
-            
-            return response.data
+            return list(iter_rows(
+                lambda: self.supabase.table('posted_deals').select(RECENT_DEAL_COLUMNS).gte('posted_at', cutoff_time.isoformat()).gte('discount_percent', min_discount).order('posted_at.desc,id')
+            ))
             
         except Exception as e:
-            logger.error(f"Error getting recent deals: {e}")
+            logger.error("Error getting recent deals: %s", e)
             return []
     
     def cleanup_old_deals(self, days_old: int = 7) -> bool:
@@ -220,20 +378,25 @@ class DealDatabase:
             return False
         
         try:
-            from datetime import timedelta
-            cutoff_time = datetime.now(timezone.utc) - timedelta(days=days_old)
+            cutoff_time = _cutoff(days=days_old)
             
-            response = self.supabase.table('posted_deals').delete().lt('posted_at', cutoff_time.isoformat()).execute()
+            # Ask only for a row count; returning the deleted rows would ship them all back
+            response = self.supabase.table('posted_deals').delete(returning='minimal', count='exact').lt('posted_at', cutoff_time.isoformat()).execute()
             
-            deleted_count = len(response.data) if response.data else 0
-            logger.info(f"Cleaned up {deleted_count} old deals (older than {days_old} days)")
+            deleted_count = response.count or 0
+            logger.info("Cleaned up %s old deals (older than %s days)", deleted_count, days_old)
             
             return True
             
         except Exception as e:
-            logger.error(f"Error cleaning up old deals: {e}")
+            logger.error("Error cleaning up old deals: %s", e)
             return False
 
+@lru_cache(maxsize=1)
+def get_database() -> DealDatabase:
+    """Return the process-wide DealDatabase, so its posted-hash caches stay warm between runs"""
+    return DealDatabase()
+
 if __name__ == "__main__":
     # Test the database operations
     logging.basicConfig(level=logging.INFO)
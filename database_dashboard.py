@@ -7,30 +7,57 @@ using Supabase database instead of JSON files.
 
 import os
 import json
+import time
+import atexit
+import pickle
 import logging
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+import matplotlib
+matplotlib.use('Agg')  # Reports are only written to files; skip GUI backend setup
 import matplotlib.pyplot as plt
-import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
 
+from db_client import get_supabase, iter_rows
 from database_monitor import DatabaseDealMonitor
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+# Shared Supabase client
+supabase: Client = get_supabase()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Deal source name -> historical data key
+SOURCE_KEYS = {"raise": "gcx", "cardcash": "cardcash"}
+
+# Cached session stats older than this are discarded and reloaded in full
+HISTORY_CACHE_TTL_SECONDS = 30 * 60
+
+# Frequency adjustment changes within this window are written together
+ADJUSTMENTS_FLUSH_DELAY_SECONDS = 5
+
+
+def _json_loads(data: bytes):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj) -> bytes:
+    """Serialize an object to compact JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
 
 class DatabaseTurnoverDashboard:
     """Database-driven dashboard for analyzing deal turnover patterns"""
@@ -40,21 +67,28 @@ class DatabaseTurnoverDashboard:
         self.monitor = DatabaseDealMonitor()
         self.reports_dir = "reports"
         self.frequency_adjustments_file = "frequency_adjustments.json"
+        self.history_cache_file = os.path.join(self.reports_dir, ".hist_cache.pkl")
         
         # Ensure directories exist
         os.makedirs(self.reports_dir, exist_ok=True)
         os.makedirs("logs", exist_ok=True)
         
+        # Frequency adjustments live in memory and are written behind when changed
+        self._dirty = False
+        self._flush_lock = threading.Lock()
+        self._flush_timer = None
+        
         # Load historical data and frequency adjustments
         self.historical_data = self._load_historical_data()
         self.frequency_adjustments = self._load_frequency_adjustments()
+        atexit.register(self._save_frequency_adjustments)
     
     def _load_frequency_adjustments(self):
-        """Load frequency adjustment settings from JSON file"""
+        """Load frequency adjustment settings from JSON file (once; changes are written behind)"""
         try:
-            with open(self.frequency_adjustments_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(self.frequency_adjustments_file, 'rb') as f:
+                return _json_loads(f.read())
+        except (FileNotFoundError, ValueError):
             # Create default frequency adjustments
             default_adjustments = {
                 "source_adjustments": {
@@ -63,30 +97,83 @@ class DatabaseTurnoverDashboard:
                 },
                 "last_updated": datetime.now().isoformat()
             }
-            with open(self.frequency_adjustments_file, 'w') as f:
-                json.dump(default_adjustments, f, indent=2)
+            self._dirty = True
+            self._schedule_flush()
             return default_adjustments
     
+    def _schedule_flush(self):
+        """Write pending frequency adjustments after a short delay, coalescing bursts"""
+        with self._flush_lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(ADJUSTMENTS_FLUSH_DELAY_SECONDS, self._save_frequency_adjustments)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
     def _save_frequency_adjustments(self):
-        """Save frequency adjustments to file"""
-        self.frequency_adjustments["last_updated"] = datetime.now().isoformat()
-        with open(self.frequency_adjustments_file, 'w') as f:
-            json.dump(self.frequency_adjustments, f, indent=2)
+        """Save frequency adjustments to file if they changed (atomic replace)"""
+        with self._flush_lock:
+            self._flush_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = _json_dumps(self.frequency_adjustments)
+        
+        tmp_path = self.frequency_adjustments_file + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.frequency_adjustments_file)
+        except Exception as e:
+            logger.error("Error saving frequency adjustments: %s", e)
+    
+    def _read_history_cache(self):
+        """Return the cached session stats, or None if missing, unreadable or past its TTL"""
+        try:
+            with open(self.history_cache_file, 'rb') as f:
+                cache = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable history cache: %s", e)
+            return None
+        
+        if time.time() - cache["saved_at"] > HISTORY_CACHE_TTL_SECONDS:
+            return None
+        return cache
+    
+    def _write_history_cache(self, rows, last_seen):
+        """Atomically save the session stats and their start_time watermark"""
+        tmp_path = self.history_cache_file + ".tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({"saved_at": time.time(), "last_seen": last_seen, "rows": rows}, f)
+            os.replace(tmp_path, self.history_cache_file)
+        except Exception as e:
+            logger.warning("Could not save history cache: %s", e)
     
     def _load_historical_data(self):
         """Load historical data from database"""
-        # Query the database for historical data
-        # Get the last 30 days of session data
-        cutoff_date = (datetime.now() - timedelta(days=30)).isoformat()
+        # Only sessions from the last 30 days count towards history
+        cutoff = datetime.now(timezone.utc) - timedelta(days=30)
         
-        sessions_response = supabase.table("monitoring_sessions").select("*").gte("start_time", cutoff_date).execute()
+        # Start from the cached stats and fetch only sessions since the watermark. The
+        # newest cached session is re-fetched too, since it may have been in progress.
+        cache = self._read_history_cache()
+        cached_rows = cache["rows"] if cache else []
+        since = cache["last_seen"] if cache else cutoff.isoformat()
         
-        if not sessions_response.data:
-            logger.info("No historical data found in database")
-            return {
-                "gcx": {"lifetimes": [], "turnover_rates": []},
-                "cardcash": {"lifetimes": [], "turnover_rates": []}
-            }
+        fetched_rows = list(iter_rows(lambda: supabase.table("v_session_stats").select(
+            "session_id, start_time, source, avg_lifetime_minutes, turnover_rate"
+        ).gte("start_time", since).order("start_time,session_id,source")))
+        
+        fetched_sessions = {row["session_id"] for row in fetched_rows}
+        rows = [
+            row for row in cached_rows
+            if row["session_id"] not in fetched_sessions and datetime.fromisoformat(row["start_time"]) >= cutoff
+        ] + fetched_rows
+        
+        if rows:
+            self._write_history_cache(rows, max(rows, key=lambda row: datetime.fromisoformat(row["start_time"]))["start_time"])
         
         # Process session data
         historical_data = {
@@ -94,32 +181,30 @@ class DatabaseTurnoverDashboard:
             "cardcash": {"lifetimes": [], "turnover_rates": []}
         }
         
-        for session in sessions_response.data:
-            session_id = session["session_id"]
-            
-            # For each session, analyze results
-            analysis_result = self.monitor.analyze_session(session_id)
-            
-            if analysis_result:
-                gcx_stats = analysis_result.get("gcx_stats", {})
-                cardcash_stats = analysis_result.get("cardcash_stats", {})
-                
-                if gcx_stats.get("avg_lifetime_minutes"):
-                    historical_data["gcx"]["lifetimes"].append(gcx_stats["avg_lifetime_minutes"])
-                    historical_data["gcx"]["turnover_rates"].append(gcx_stats["turnover_rate"])
-                
-                if cardcash_stats.get("avg_lifetime_minutes"):
-                    historical_data["cardcash"]["lifetimes"].append(cardcash_stats["avg_lifetime_minutes"])
-                    historical_data["cardcash"]["turnover_rates"].append(cardcash_stats["turnover_rate"])
-        
-        logger.info(f"Loaded historical data: {len(historical_data['gcx']['lifetimes'])} GCX records, "
-                    f"{len(historical_data['cardcash']['lifetimes'])} CardCash records")
+        if not rows:
+            logger.info("No historical data found in database")
+            return historical_data
+        
+        for row in rows:
+            source_key = SOURCE_KEYS.get(row["source"])
+            if source_key and row["avg_lifetime_minutes"]:
+                historical_data[source_key]["lifetimes"].append(float(row["avg_lifetime_minutes"]))
+                historical_data[source_key]["turnover_rates"].append(float(row["turnover_rate"]))
+        
+        # Stored as arrays so summaries are single vectorized reductions
+        for source_data in historical_data.values():
+            for metric, values in source_data.items():
+                source_data[metric] = np.asarray(values, dtype=np.float32)
+        
+        logger.info("Loaded historical data: %s GCX records, %s CardCash records (%s rows fetched)",
+                    len(historical_data['gcx']['lifetimes']), len(historical_data['cardcash']['lifetimes']),
+                    len(fetched_rows))
         
         return historical_data
     
     def run_analysis(self, duration_minutes=60, check_interval_minutes=10):
         """Run a new analysis session"""
-        logger.info(f"Running {duration_minutes}-minute analysis with {check_interval_minutes}-minute intervals")
+        logger.info("Running %s-minute analysis with %s-minute intervals", duration_minutes, check_interval_minutes)
         
         # Run monitoring session
         self.monitor.run_monitoring_session(
@@ -138,32 +223,25 @@ class DatabaseTurnoverDashboard:
         logger.info("Generating reports...")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Create dataframes for analysis
-        gcx_df = pd.DataFrame({
-            'Lifetime (min)': self.historical_data['gcx']['lifetimes'],
-            'Turnover Rate': self.historical_data['gcx']['turnover_rates']
-        })
-        
-        cardcash_df = pd.DataFrame({
-            'Lifetime (min)': self.historical_data['cardcash']['lifetimes'],
-            'Turnover Rate': self.historical_data['cardcash']['turnover_rates']
-        })
+        # Metric arrays go straight to matplotlib
+        gcx_data = {metric: np.asarray(values, dtype=np.float32) for metric, values in self.historical_data['gcx'].items()}
+        cardcash_data = {metric: np.asarray(values, dtype=np.float32) for metric, values in self.historical_data['cardcash'].items()}
         
         # Generate lifetime histogram
-        self._generate_lifetime_histogram(gcx_df, cardcash_df, timestamp)
+        self._generate_lifetime_histogram(gcx_data, cardcash_data, timestamp)
         
         # Generate turnover rate trends
-        self._generate_turnover_trend(gcx_df, cardcash_df, timestamp)
+        self._generate_turnover_trend(gcx_data, cardcash_data, timestamp)
         
         # Generate recommendation summary
         self._generate_recommendation_summary(timestamp)
     
-    def _generate_lifetime_histogram(self, gcx_df, cardcash_df, timestamp):
+    def _generate_lifetime_histogram(self, gcx_data, cardcash_data, timestamp):
         """Generate histogram of deal lifetimes"""
         plt.figure(figsize=(10, 6))
         
-        if not gcx_df.empty and not cardcash_df.empty:
-            plt.hist([gcx_df['Lifetime (min)'], cardcash_df['Lifetime (min)']], 
+        if gcx_data['lifetimes'].size and cardcash_data['lifetimes'].size:
+            plt.hist([gcx_data['lifetimes'], cardcash_data['lifetimes']], 
                     bins=20, alpha=0.7, label=['GCX', 'CardCash'])
             plt.xlabel('Deal Lifetime (minutes)')
             plt.ylabel('Frequency')
@@ -175,17 +253,19 @@ class DatabaseTurnoverDashboard:
             output_path = os.path.join(self.reports_dir, f"lifetime_distribution_{timestamp}.png")
             plt.savefig(output_path)
             plt.close()
-            logger.info(f"Saved lifetime histogram to {output_path}")
+            logger.info("Saved lifetime histogram to %s", output_path)
     
-    def _generate_turnover_trend(self, gcx_df, cardcash_df, timestamp):
+    def _generate_turnover_trend(self, gcx_data, cardcash_data, timestamp):
         """Generate trend chart of turnover rates"""
         plt.figure(figsize=(10, 6))
         
-        if not gcx_df.empty:
-            plt.plot(range(len(gcx_df)), gcx_df['Turnover Rate'], 'b-', label='GCX')
+        gcx_turnover = gcx_data['turnover_rates']
+        if gcx_turnover.size:
+            plt.plot(np.arange(gcx_turnover.size), gcx_turnover, 'b-', label='GCX')
         
-        if not cardcash_df.empty:
-            plt.plot(range(len(cardcash_df)), cardcash_df['Turnover Rate'], 'r-', label='CardCash')
+        cardcash_turnover = cardcash_data['turnover_rates']
+        if cardcash_turnover.size:
+            plt.plot(np.arange(cardcash_turnover.size), cardcash_turnover, 'r-', label='CardCash')
         
         plt.xlabel('Analysis Session')
         plt.ylabel('Turnover Rate')
@@ -197,16 +277,22 @@ class DatabaseTurnoverDashboard:
         output_path = os.path.join(self.reports_dir, f"turnover_trend_{timestamp}.png")
         plt.savefig(output_path)
         plt.close()
-        logger.info(f"Saved turnover trend to {output_path}")
+        logger.info("Saved turnover trend to %s", output_path)
+    
+    @staticmethod
+    def _mean(values) -> float:
+        """Mean of a metric array, or 0 when there is no data"""
+        values = np.asarray(values, dtype=np.float32)
+        return float(values.mean()) if values.size else 0.0
     
     def _generate_recommendation_summary(self, timestamp):
         """Generate a summary of scraping recommendations"""
         # Calculate average metrics
-        gcx_avg_lifetime = sum(self.historical_data['gcx']['lifetimes']) / len(self.historical_data['gcx']['lifetimes']) if self.historical_data['gcx']['lifetimes'] else 0
-        cardcash_avg_lifetime = sum(self.historical_data['cardcash']['lifetimes']) / len(self.historical_data['cardcash']['lifetimes']) if self.historical_data['cardcash']['lifetimes'] else 0
+        gcx_avg_lifetime = self._mean(self.historical_data['gcx']['lifetimes'])
+        cardcash_avg_lifetime = self._mean(self.historical_data['cardcash']['lifetimes'])
         
-        gcx_avg_turnover = sum(self.historical_data['gcx']['turnover_rates']) / len(self.historical_data['gcx']['turnover_rates']) if self.historical_data['gcx']['turnover_rates'] else 0
-        cardcash_avg_turnover = sum(self.historical_data['cardcash']['turnover_rates']) / len(self.historical_data['cardcash']['turnover_rates']) if self.historical_data['cardcash']['turnover_rates'] else 0
+        gcx_avg_turnover = self._mean(self.historical_data['gcx']['turnover_rates'])
+        cardcash_avg_turnover = self._mean(self.historical_data['cardcash']['turnover_rates'])
         
         # Create recommendation
         recommendations = self.monitor.recommend_scraping_frequency(
@@ -252,7 +338,7 @@ class DatabaseTurnoverDashboard:
         with open(output_path, 'w') as f:
             f.write(summary)
         
-        logger.info(f"Saved analysis summary to {output_path}")
+        logger.info("Saved analysis summary to %s", output_path)
         
         # Return the minutes value for scheduling
         return recommendations['minutes']
@@ -260,12 +346,15 @@ class DatabaseTurnoverDashboard:
     def adjust_scraping_frequency(self, source: str, factor: float):
         """Adjust scraping frequency for a specific source"""
         if source not in ['raise', 'cardcash']:
-            logger.error(f"Invalid source: {source}. Must be 'raise' or 'cardcash'.")
+            logger.error("Invalid source: %s. Must be 'raise' or 'cardcash'.", source)
             return
         
-        self.frequency_adjustments['source_adjustments'][source] = factor
-        self._save_frequency_adjustments()
-        logger.info(f"Adjusted {source} frequency by factor {factor}")
+        with self._flush_lock:
+            self.frequency_adjustments['source_adjustments'][source] = factor
+            self.frequency_adjustments["last_updated"] = datetime.now().isoformat()
+            self._dirty = True
+        self._schedule_flush()
+        logger.info("Adjusted %s frequency by factor %s", source, factor)
     
     def get_adjusted_frequency(self, base_minutes: int, source: str) -> int:
         """Get adjusted frequency for a source based on base recommendation"""
@@ -290,4 +379,9 @@ def main():
 
 
 if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     main()
@@ -5,25 +5,25 @@ Tracks how often deals appear and disappear on CardCash and GCX
 using Supabase database for storage instead of JSON files.
 """
 
-import time
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Set
 from collections import defaultdict
+from functools import lru_cache
 import hashlib
-import os
+import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
 
-from scraper import get_all_deals
+from db_client import chunks, get_supabase, iter_rows
+from scraper import get_all_deals_async
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Supabase client
-url: str = os.environ.get("SUPABASE_URL")
-key: str = os.environ.get("SUPABASE_ANON_KEY")
-supabase: Client = create_client(url, key)
+# Shared Supabase client
+supabase: Client = get_supabase()
 
 # Configure logging
 logging.basicConfig(
@@ -33,6 +33,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=8192)
+def _hash_deal_fields(source: str, merchant: str, face_value, price) -> str:
+    """Hash a deal's identifying fields (cached: the same deals recur across checks for hours)"""
+    deal_string = f"{source}-{merchant}-{face_value}-{price}"
+    # 80-bit BLAKE2b: faster than MD5 and far fewer collisions than a 48-bit truncation
+    return hashlib.blake2b(deal_string.encode(), digest_size=10).hexdigest()
+
+
 class DatabaseDealMonitor:
     def __init__(self):
         """Initialize the database-driven deal monitor."""
@@ -42,102 +50,113 @@ class DatabaseDealMonitor:
     def create_deal_hash(self, deal: Dict) -> str:
         """Create a unique hash for a deal"""
         # Use merchant, face_value, price, and source to create unique identifier
-        deal_string = f"{deal.get('source', '')}-{deal.get('merchant', '')}-{deal.get('face_value', 0)}-{deal.get('price', 0)}"
-        return hashlib.md5(deal_string.encode()).hexdigest()[:12]
+        return _hash_deal_fields(deal.get('source', ''), deal.get('merchant', ''), deal.get('face_value', 0), deal.get('price', 0))
     
-    def run_monitoring_session(self, duration_minutes: int = 60, check_interval_minutes: int = 10):
-        """Run a monitoring session to track deal changes using database storage"""
-        logger.info(f"Starting {duration_minutes}-minute monitoring session with {check_interval_minutes}-minute intervals")
-        
+    def _start_session(self, duration_minutes: int, check_interval_minutes: int) -> str:
+        """Create the monitoring session record and return its ID"""
         session_id = datetime.now().isoformat()
         
         # Create session record in database
         session_data = {
             "session_id": session_id,
-            "start_time": datetime.now().isoformat(),
+            "start_time": session_id,
             "duration_minutes": duration_minutes,
             "check_interval_minutes": check_interval_minutes,
         }
         supabase.table("monitoring_sessions").upsert(session_data).execute()
+        return session_id
+    
+    def _record_snapshot(self, session_id: str, check_count: int, current_deals: List[Dict], timestamp: str):
+        """Store one snapshot of the current deals for a session, taken at the given ISO timestamp"""
+        # Create snapshot record
+        snapshot_data = {
+            "session_id": session_id,
+            "timestamp": timestamp,
+            "check_number": check_count,
+        }
+        
+        # Insert snapshot and get its ID
+        snapshot_response = supabase.table("snapshots").insert(snapshot_data).execute()
+        if not snapshot_response.data:
+            logger.error("Failed to create snapshot record")
+            return
+            
+        snapshot_id = snapshot_response.data[0]['id']
+        
+        # One record per distinct deal (the same deal can be listed twice)
+        deals_by_hash = {self.create_deal_hash(deal): deal for deal in current_deals}
+        payload = [
+            {
+                "hash": deal_hash,
+                "merchant": deal.get('merchant', 'Unknown'),
+                "face_value": deal.get('face_value', 0),
+                "price": deal.get('price', 0),
+                "discount_percent": deal.get('discount_percent', 0),
+                "url": deal.get('url', ''),
+                "source": deal.get('source', '')
+            }
+            for deal_hash, deal in deals_by_hash.items()
+        ]
+        
+        # Upsert deals, bump their counters and link them to the snapshot server-side
+        # in one transaction (see record_snapshot_deals in database_schema.sql)
+        for batch in chunks(payload):
+            supabase.rpc("record_snapshot_deals", {"p_snapshot_id": snapshot_id, "p_deals": batch}).execute()
+        
+        # Count by source
+        gcx_count = sum(1 for deal in current_deals if deal.get('source') == 'raise')
+        cardcash_count = sum(1 for deal in current_deals if deal.get('source') == 'cardcash')
+        
+        logger.info(f"Snapshot {check_count} complete: {gcx_count} GCX deals, {cardcash_count} CardCash deals")
+    
+    def run_monitoring_session(self, duration_minutes: int = 60, check_interval_minutes: int = 10) -> str:
+        """Run a monitoring session to track deal changes using database storage"""
+        return asyncio.run(self.run_monitoring_session_async(duration_minutes, check_interval_minutes))
+    
+    async def run_monitoring_session_async(self, duration_minutes: int = 60, check_interval_minutes: int = 10) -> str:
+        """
+        Async variant of run_monitoring_session.
+        Each check scrapes GCX and CardCash concurrently, and a snapshot is written to
+        the database in the background while the session waits for the next check.
+        """
+        logger.info(f"Starting {duration_minutes}-minute monitoring session with {check_interval_minutes}-minute intervals")
+        
+        session_id = await asyncio.to_thread(self._start_session, duration_minutes, check_interval_minutes)
         
         end_time = datetime.now() + timedelta(minutes=duration_minutes)
         check_count = 0
+        persist_task = None
         
-        while datetime.now() < end_time:
-            check_count += 1
-            logger.info(f"Taking snapshot {check_count}...")
-            
-            # Get current deals
-            current_deals = get_all_deals(['raise', 'cardcash'])
-            
-            # Create snapshot record
-            snapshot_data = {
-                "session_id": session_id,
-                "timestamp": datetime.now().isoformat(),
-                "check_number": check_count,
-            }
-            
-            # Insert snapshot and get its ID
-            snapshot_response = supabase.table("snapshots").insert(snapshot_data).execute()
-            if not snapshot_response.data:
-                logger.error("Failed to create snapshot record")
-                continue
-                
-            snapshot_id = snapshot_response.data[0]['id']
-            
-            # Process each deal
-            gcx_count = 0
-            cardcash_count = 0
-            
-            for deal in current_deals:
-                deal_hash = self.create_deal_hash(deal)
-                
-                # Update deal record or create if it doesn't exist
-                deal_data = {
-                    "hash": deal_hash,
-                    "merchant": deal.get('merchant', 'Unknown'),
-                    "face_value": deal.get('face_value', 0),
-                    "price": deal.get('price', 0),
-                    "discount_percent": deal.get('discount_percent', 0),
-                    "url": deal.get('url', ''),
-                    "source": deal.get('source', '')
-                }
-                
-                # Check if deal exists in database
-                deal_response = supabase.table("deals").select("*").eq("hash", deal_hash).execute()
+        try:
+            # One clock read per check, shared by the deadline test and the snapshot row
+            while (now := datetime.now()) < end_time:
+                now_iso = now.isoformat()
+                check_count += 1
+                logger.info(f"Taking snapshot {check_count}...")
                 
-                if not deal_response.data:
-                    # New deal - create record with first_seen
-                    deal_data["first_seen"] = datetime.now().isoformat()
-                    deal_data["last_seen"] = datetime.now().isoformat()
-                    deal_data["appearances"] = 1
-                    supabase.table("deals").insert(deal_data).execute()
-                else:
-                    # Update existing deal's last_seen time and increment appearances
-                    supabase.table("deals").update({
-                        "last_seen": datetime.now().isoformat(),
-                        "appearances": deal_response.data[0]['appearances'] + 1
-                    }).eq("hash", deal_hash).execute()
+                # Get current deals from both sources at once
+                # Live pages only: a cached page would repeat the last snapshot and read as zero turnover
+                current_deals = await get_all_deals_async(['raise', 'cardcash'], fresh=True)
                 
-                # Link deal to snapshot
-                supabase.table("snapshot_deals").upsert({
-                    "snapshot_id": snapshot_id,
-                    "deal_hash": deal_hash
-                }).execute()
+                # Snapshots are written in check order, overlapping the wait for the next check
+                if persist_task is not None:
+                    await persist_task
+                persist_task = asyncio.create_task(
+                    asyncio.to_thread(self._record_snapshot, session_id, check_count, current_deals, now_iso)
+                )
                 
-                # Count by source
-                if deal.get('source') == 'raise':
-                    gcx_count += 1
-                elif deal.get('source') == 'cardcash':
-                    cardcash_count += 1
-            
-            logger.info(f"Snapshot {check_count} complete: {gcx_count} GCX deals, {cardcash_count} CardCash deals")
-            
-            # Sleep until next check
-            if datetime.now() < end_time:
-                sleep_time = check_interval_minutes * 60
-                logger.info(f"Sleeping for {check_interval_minutes} minutes...")
-                time.sleep(sleep_time)
+                # Sleep until next check, but never past the end of the session
+                remaining = (end_time - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                sleep_time = min(check_interval_minutes * 60, remaining)
+                logger.info(f"Sleeping for {sleep_time / 60:.1f} minutes...")
+                await asyncio.sleep(sleep_time)
+        finally:
+            if persist_task is not None:
+                await persist_task
+        
+        return session_id
     
     def analyze_session(self, session_id: str):
         """Analyze a monitoring session for deal turnover patterns using database data"""
@@ -152,7 +171,7 @@ class DatabaseDealMonitor:
         session = session_response.data[0]
         
         # Get all snapshots for this session
-        snapshots_response = supabase.table("snapshots").select("*").eq("session_id", session_id).order("check_number").execute()
+        snapshots_response = supabase.table("snapshots").select("id").eq("session_id", session_id).execute()
         if not snapshots_response.data:
             logger.error(f"No snapshots found for session {session_id}")
             return None
@@ -160,38 +179,24 @@ class DatabaseDealMonitor:
         snapshots = snapshots_response.data
         
         # Track deals by source
-        gcx_deals_timeline = {}
-        cardcash_deals_timeline = {}
+        gcx_deals_timeline = defaultdict(list)
+        cardcash_deals_timeline = defaultdict(list)
+        timelines_by_source = {'raise': gcx_deals_timeline, 'cardcash': cardcash_deals_timeline}
         
-        for snapshot in snapshots:
-            snapshot_id = snapshot['id']
-            
-            # Get deals in this snapshot
-            deals_response = supabase.from_("snapshot_deals").select(
-                "deals(*)"
-            ).eq("snapshot_id", snapshot_id).execute()
-            
-            if not deals_response.data:
+        # Get every deal in every snapshot of this session in one joined query
+        session_deals = iter_rows(lambda: supabase.from_("snapshot_deals").select(
+            "snapshot_id, deals(hash,source), snapshots!inner(check_number,session_id)"
+        ).eq("snapshots.session_id", session_id).order("snapshot_id,deal_hash"))
+        
+        # Record presence in timeline
+        for item in session_deals:
+            deal = item['deals']
+            if not deal:
                 continue
             
-            # Record presence in timeline
-            for item in deals_response.data:
-                deal = item['deals']
-                if not deal:
-                    continue
-                
-                deal_hash = deal['hash']
-                source = deal['source']
-                check_num = snapshot['check_number']
-                
-                if source == 'raise':
-                    if deal_hash not in gcx_deals_timeline:
-                        gcx_deals_timeline[deal_hash] = []
-                    gcx_deals_timeline[deal_hash].append(check_num)
-                elif source == 'cardcash':
-                    if deal_hash not in cardcash_deals_timeline:
-                        cardcash_deals_timeline[deal_hash] = []
-                    cardcash_deals_timeline[deal_hash].append(check_num)
+            timeline = timelines_by_source.get(deal['source'])
+            if timeline is not None:
+                timeline[deal['hash']].append(item['snapshots']['check_number'])
         
         # Calculate statistics
         num_snapshots = len(snapshots)
@@ -217,37 +222,19 @@ class DatabaseDealMonitor:
         if total_deals == 0:
             return {"total_deals_seen": 0}
         
-        # Calculate statistics
-        deal_lifespans = []
-        disappeared_deals = 0
+        # Only deals seen in at least two snapshots have a measurable lifespan;
+        # min/max are O(k) and don't need the appearances sorted
+        spans = [(min(appearances), max(appearances)) for appearances in deal_timeline.values() if len(appearances) >= 2]
+        first_seen, last_seen = np.array(spans, dtype=np.int32).reshape(-1, 2).T
         
-        for deal_hash, appearances in deal_timeline.items():
-            # Sort appearance check numbers
-            appearances.sort()
-            
-            # Calculate lifespan in check intervals
-            if len(appearances) < 2:
-                continue
-                
-            first_seen = appearances[0]
-            last_seen = appearances[-1]
-            
-            # If the deal wasn't seen in the last snapshot, it disappeared
-            if last_seen < num_snapshots:
-                disappeared_deals += 1
-            
-            # Calculate lifespan in check intervals
-            lifespan_checks = last_seen - first_seen + 1
-            
-            # Convert to minutes
-            lifespan_minutes = lifespan_checks * interval_minutes
-            deal_lifespans.append(lifespan_minutes)
+        # If the deal wasn't seen in the last snapshot, it disappeared
+        disappeared_deals = int(np.count_nonzero(last_seen < num_snapshots))
+        
+        # Lifespan in check intervals, converted to minutes
+        deal_lifespans = (last_seen - first_seen + 1) * interval_minutes
         
         # Calculate average lifespan
-        if deal_lifespans:
-            avg_lifetime_minutes = sum(deal_lifespans) / len(deal_lifespans)
-        else:
-            avg_lifetime_minutes = 0
+        avg_lifetime_minutes = float(deal_lifespans.mean()) if deal_lifespans.size else 0
         
         # Calculate turnover rate
         if total_deals > 0:
@@ -32,3 +32,66 @@ CREATE TABLE snapshot_deals (
     deal_hash TEXT REFERENCES deals(hash),
     PRIMARY KEY (snapshot_id, deal_hash)
 );
+
+-- Per-session turnover statistics by source, mirroring DatabaseDealMonitor._calculate_turnover_stats.
+-- Lets the dashboard load all sessions' stats in one query instead of analyzing each session.
+CREATE OR REPLACE VIEW v_session_stats AS
+WITH deal_spans AS (
+    SELECT s.session_id,
+           d.source,
+           sd.deal_hash,
+           MIN(s.check_number) AS first_check,
+           MAX(s.check_number) AS last_check,
+           COUNT(*) AS appearances
+    FROM snapshot_deals sd
+    JOIN snapshots s ON s.id = sd.snapshot_id
+    JOIN deals d ON d.hash = sd.deal_hash
+    GROUP BY s.session_id, d.source, sd.deal_hash
+),
+session_checks AS (
+    SELECT session_id, COUNT(*) AS num_snapshots
+    FROM snapshots
+    GROUP BY session_id
+)
+SELECT ds.session_id,
+       ms.start_time,
+       ds.source,
+       COUNT(*) AS total_deals_seen,
+       COUNT(*) FILTER (WHERE ds.appearances >= 2 AND ds.last_check < sc.num_snapshots) AS disappeared_deals,
+       COALESCE(AVG((ds.last_check - ds.first_check + 1) * ms.check_interval_minutes)
+                FILTER (WHERE ds.appearances >= 2), 0) AS avg_lifetime_minutes,
+       (COUNT(*) FILTER (WHERE ds.appearances >= 2 AND ds.last_check < sc.num_snapshots))::FLOAT
+           / COUNT(*) AS turnover_rate
+FROM deal_spans ds
+JOIN session_checks sc ON sc.session_id = ds.session_id
+JOIN monitoring_sessions ms ON ms.session_id = ds.session_id
+GROUP BY ds.session_id, ms.start_time, ds.source;
+
+-- Record one monitoring check in a single transaction: insert new deals, bump
+-- last_seen/appearances on known ones, and link them all to the snapshot.
+-- p_deals is a JSON array of {hash, merchant, face_value, price, discount_percent, url, source}.
+CREATE OR REPLACE FUNCTION record_snapshot_deals(p_snapshot_id INTEGER, p_deals JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    linked INTEGER;
+BEGIN
+    INSERT INTO deals AS d (hash, source, merchant, face_value, price, discount_percent, url,
+                            first_seen, last_seen, appearances)
+    SELECT DISTINCT ON (p.hash)
+           p.hash, p.source, p.merchant, p.face_value, p.price, p.discount_percent, p.url,
+           NOW(), NOW(), 1
+    FROM jsonb_to_recordset(p_deals) AS p(hash TEXT, source TEXT, merchant TEXT, face_value NUMERIC,
+                                          price NUMERIC, discount_percent NUMERIC, url TEXT)
+    ON CONFLICT (hash) DO UPDATE
+        SET last_seen = NOW(),
+            appearances = d.appearances + 1;
+
+    INSERT INTO snapshot_deals (snapshot_id, deal_hash)
+    SELECT DISTINCT p_snapshot_id, p.hash
+    FROM jsonb_to_recordset(p_deals) AS p(hash TEXT)
+    ON CONFLICT DO NOTHING;
+
+    GET DIAGNOSTICS linked = ROW_COUNT;
+    RETURN linked;
+END;
+$$ LANGUAGE plpgsql;
@@ -16,10 +16,26 @@ CREATE TABLE IF NOT EXISTS posted_deals (
 );
 
 -- Indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_posted_deals_hash ON posted_deals(deal_hash);
-CREATE INDEX IF NOT EXISTS idx_posted_deals_posted_at ON posted_deals(posted_at);
+-- deal_hash lookups use the unique index backing the UNIQUE constraint above.
+-- posted_at is (nearly) insertion-ordered, so a tiny BRIN index covers the time-range scans.
+-- On an existing database, create these with CREATE INDEX CONCURRENTLY outside a transaction.
+DROP INDEX IF EXISTS idx_posted_deals_hash;
+DROP INDEX IF EXISTS idx_posted_deals_posted_at;
+CREATE INDEX IF NOT EXISTS idx_posted_deals_posted_at_brin ON posted_deals USING BRIN (posted_at);
 CREATE INDEX IF NOT EXISTS idx_posted_deals_source ON posted_deals(source);
 CREATE INDEX IF NOT EXISTS idx_posted_deals_discount ON posted_deals(discount_percent);
+-- Matches the default min_discount of DealDatabase.get_recent_deals
+CREATE INDEX IF NOT EXISTS idx_posted_deals_discount_15 ON posted_deals(discount_percent) WHERE discount_percent >= 15;
+
+-- Duplicate check: which of the given hashes were posted (optionally since a cutoff).
+-- Called via RPC so each lookup is one POST with a JSON body and a cached plan.
+CREATE OR REPLACE FUNCTION posted_deal_hashes_hit(hs TEXT[], since TIMESTAMP WITH TIME ZONE DEFAULT NULL)
+RETURNS TABLE (deal_hash TEXT, posted_at TIMESTAMP WITH TIME ZONE) AS $$
+    SELECT p.deal_hash::TEXT, p.posted_at
+    FROM posted_deals p
+    WHERE p.deal_hash = ANY(hs)
+      AND (since IS NULL OR p.posted_at >= since);
+$$ LANGUAGE sql STABLE;
 
 -- Optional: Table to track bot execution logs
 CREATE TABLE IF NOT EXISTS bot_executions (
@@ -57,6 +73,18 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Upsert a single merchant's stats in one round-trip (called from DealDatabase.update_merchant_stats)
+CREATE OR REPLACE FUNCTION upsert_merchant_stat(m TEXT, d FLOAT)
+RETURNS VOID AS $$
+    INSERT INTO merchant_stats (merchant, total_deals, avg_discount, last_seen)
+    VALUES (m, 1, d, NOW())
+    ON CONFLICT (merchant)
+    DO UPDATE SET
+        total_deals = merchant_stats.total_deals + 1,
+        avg_discount = ROUND(((merchant_stats.avg_discount * merchant_stats.total_deals) + d)::NUMERIC / (merchant_stats.total_deals + 1), 2),
+        last_seen = NOW();
+$$ LANGUAGE sql;
+
 -- Trigger to automatically update merchant stats when deals are posted
 -- Drop the trigger if it exists (Postgres 11+ syntax)
 DROP TRIGGER IF EXISTS trigger_update_merchant_stats ON posted_deals;
@@ -67,5 +95,31 @@ CREATE TRIGGER trigger_update_merchant_stats
     FOR EACH ROW
     EXECUTE FUNCTION update_merchant_stats();
 
--- Clean up old deals (optional - run periodically)
--- DELETE FROM posted_deals WHERE posted_at < NOW() - INTERVAL '30 days';
+-- Clean up old deals in batches, committing after each one so locks and WAL are
+-- released as it goes. A procedure (not a function) so it can COMMIT: run it with
+-- CALL as a top-level statement, not through PostgREST RPC or inside a transaction.
+DROP FUNCTION IF EXISTS cleanup_old_posted_deals(INTEGER, INTEGER);
+CREATE OR REPLACE PROCEDURE cleanup_old_posted_deals(days_old INTEGER DEFAULT 7, batch_size INTEGER DEFAULT 10000)
+AS $$
+DECLARE
+    deleted INTEGER;
+    total INTEGER := 0;
+BEGIN
+    LOOP
+        DELETE FROM posted_deals
+        WHERE ctid IN (
+            SELECT ctid FROM posted_deals
+            WHERE posted_at < NOW() - make_interval(days => days_old)
+            LIMIT batch_size
+        );
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        total := total + deleted;
+        COMMIT;
+        EXIT WHEN deleted < batch_size;
+    END LOOP;
+    RAISE NOTICE 'cleanup_old_posted_deals: deleted % rows', total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Optional: run the cleanup server-side every night with pg_cron
+-- SELECT cron.schedule('cleanup-posted-deals', '0 4 * * *', 'CALL cleanup_old_posted_deals(7)');
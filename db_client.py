@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Shared Supabase client for the Telegram Gift Card Deal Bot
+One long-lived client, and so one pooled HTTP/2 connection set, is reused by every module.
+"""
+
+import os
+import logging
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+import httpx
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+logger = logging.getLogger(__name__)
+
+# Keep-alive pool shared by all PostgREST requests
+HTTP_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=30)
+HTTP_TIMEOUT = 30.0
+
+@lru_cache(maxsize=1)
+def get_supabase() -> Optional[Client]:
+    """Create the Supabase client once and return the shared instance (None without credentials)."""
+    if not os.getenv('REPLIT_DEPLOYMENT'):
+        load_dotenv()
+
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_ANON_KEY')
+    if not url or not key:
+        logger.warning("Supabase credentials not found. Database operations will be disabled.")
+        return None
+
+    client = create_client(url, key)
+
+    # Swap PostgREST's default session for one with explicit pooling and HTTP/2
+    default_session = client.postgrest.session
+    client.postgrest.session = httpx.Client(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT,
+        http2=True
+    )
+    default_session.close()
+
+    logger.info("Supabase client initialized successfully")
+    return client
+
+# Supabase caps responses at 1000 rows by default, so pages must not be larger
+PAGE_SIZE = 1000
+
+def iter_rows(build_query: Callable, page_size: int = PAGE_SIZE) -> Iterator[Dict]:
+    """
+    Yield every row of a query, fetching one .range() page at a time.
+
+    build_query must return a fresh, deterministically ordered query on each call;
+    tie-breaker columns go in one order() string (e.g. 'posted_at.desc,id').
+    """
+    offset = 0
+    while True:
+        rows = build_query().range(offset, offset + page_size - 1).execute().data
+        yield from rows
+        if len(rows) < page_size:
+            break
+        offset += page_size
+
+# Rows per bulk write, keeping payloads well under PostgREST/Postgres limits
+BATCH_SIZE = 1000
+
+def chunks(rows: Sequence, size: int = BATCH_SIZE) -> Iterator[Sequence]:
+    """Split rows into consecutive slices of at most `size` items."""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
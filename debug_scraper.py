@@ -5,82 +5,106 @@ This helps us understand what data is available for scraping
 """
 
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
 import json
 import re
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 
-def debug_website(url, name):
-    """Debug a website's HTML structure"""
-    print(f"\n🔍 Debugging {name} ({url})")
-    print("=" * 60)
-    
+# Patterns used on every page, compiled once
+JSON_RE = re.compile(r'\{[^{}]*(?:"(?:gift|card|price|discount|deal|merchant|brand)")[^{}]*\}', re.IGNORECASE)
+PRICE_RE = re.compile(r'\$\d+(?:\.\d{2})?')
+PCT_RE = re.compile(r'\d+%')
+CLASS_KEYWORDS = ('card', 'gift', 'deal', 'product', 'item')
+
+# Saved HTML samples go next to this script rather than to a machine-specific path
+DEBUG_OUTPUT_DIR = Path(__file__).resolve().parent / "debug"
+
+def sample_path(name) -> Path:
+    """Where the raw HTML sample for a site is saved"""
+    return DEBUG_OUTPUT_DIR / f"debug_{name.lower().replace(' ', '_')}.html"
+
+def fetch_page(url, save_to: Path):
+    """Download and parse a page, saving the raw HTML to save_to; returns (tree, page size in bytes)"""
     session = requests.Session()
     session.headers.update({
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
     })
     
-    try:
-        response = session.get(url, timeout=30)
+    # Feed the page to lxml's C parser as it downloads instead of buffering the whole body,
+    # writing the same bytes straight to the sample file (no re-serialization of the tree)
+    save_to.parent.mkdir(parents=True, exist_ok=True)
+    with session.get(url, timeout=30, stream=True) as response, open(save_to, 'wb') as sample:
         response.raise_for_status()
+        parser = lxml.html.HTMLParser()
+        page_size = 0
+        for chunk in response.iter_content(chunk_size=65536):
+            parser.feed(chunk)
+            sample.write(chunk)
+            page_size += len(chunk)
+        return parser.close(), page_size
+
+def debug_website(url, name, page: Future = None):
+    """Debug a website's HTML structure (page: an already started fetch_page(url, sample_path(name)) call)"""
+    print(f"\n🔍 Debugging {name} ({url})")
+    print("=" * 60)
+    
+    try:
+        filename = sample_path(name)
+        tree, page_size = page.result() if page is not None else fetch_page(url, filename)
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        print(f"📄 Page Title: {soup.title.string if soup.title else 'No title'}")
-        print(f"📊 Page Size: {len(response.content)} bytes")
+        print(f"📄 Page Title: {tree.findtext('.//title') or 'No title'}")
+        print(f"📊 Page Size: {page_size} bytes")
         
         # Look for JSON data in script tags (common for modern sites)
-        script_tags = soup.find_all('script')
+        script_tags = tree.xpath('//script')
         json_data_found = False
         
         for i, script in enumerate(script_tags):
-            if script.string:
-                script_content = script.string.strip()
-                # Look for JSON-like structures
-                if any(keyword in script_content for keyword in ['gift', 'card', 'price', 'discount', 'deal']):
+            if script.text:
+                script_content = script.text.strip()
+                # Look for JSON-like structures; the regex alone decides, so each script is scanned once
+                json_matches = JSON_RE.findall(script_content)
+                if json_matches:
                     print(f"\n🎯 Potential data in script tag {i}:")
-                    # Try to extract JSON objects
-                    json_matches = re.findall(r'\{[^{}]*(?:"(?:gift|card|price|discount|deal|merchant|brand)")[^{}]*\}', script_content, re.IGNORECASE)
                     for j, match in enumerate(json_matches[:3]):  # Show first 3 matches
                         print(f"  JSON {j+1}: {match[:200]}...")
-                        json_data_found = True
+                    json_data_found = True
         
         if not json_data_found:
             print("❌ No obvious JSON data found in script tags")
         
         # Look for data attributes
-        elements_with_data = soup.find_all(attrs={"data-price": True}) + \
-                           soup.find_all(attrs={"data-discount": True}) + \
-                           soup.find_all(attrs={"data-value": True})
+        elements_with_data = tree.xpath('//*[@data-price or @data-discount or @data-value]')
         
         if elements_with_data:
             print(f"\n📋 Found {len(elements_with_data)} elements with data attributes:")
             for elem in elements_with_data[:5]:
-                print(f"  - {elem.name}: {dict(elem.attrs)}")
+                print(f"  - {elem.tag}: {dict(elem.attrib)}")
         
-        # Look for price patterns in visible text
-        all_text = soup.get_text()
-        price_matches = re.findall(r'\$\d+(?:\.\d{2})?', all_text)
-        percent_matches = re.findall(r'\d+%', all_text)
+        # Look for price patterns in visible text (script/style bodies excluded)
+        all_text = ''.join(tree.xpath('//text()[not(ancestor::script) and not(ancestor::style)]'))
+        price_matches = PRICE_RE.findall(all_text)
+        percent_matches = PCT_RE.findall(all_text)
         
         print(f"\n💰 Found {len(price_matches)} price patterns: {price_matches[:10]}")
         print(f"📈 Found {len(percent_matches)} percentage patterns: {percent_matches[:10]}")
         
         # Look for common class patterns
-        common_classes = {}
-        for elem in soup.find_all(class_=True):
-            for class_name in elem.get('class', []):
-                if any(keyword in class_name.lower() for keyword in ['card', 'gift', 'deal', 'product', 'item']):
-                    common_classes[class_name] = common_classes.get(class_name, 0) + 1
+        # Pull just the class attribute strings and keyword-test each distinct name once
+        class_counts = Counter(class_name for classes in tree.xpath('//@class') for class_name in classes.split())
+        common_classes = Counter({
+            class_name: count for class_name, count in class_counts.items()
+            if any(keyword in class_name.lower() for keyword in CLASS_KEYWORDS)
+        })
         
         if common_classes:
             print(f"\n🏷️  Common relevant classes:")
-            for class_name, count in sorted(common_classes.items(), key=lambda x: x[1], reverse=True)[:10]:
+            for class_name, count in common_classes.most_common(10):
                 print(f"  - {class_name}: {count} occurrences")
         
-        # Save a sample of the HTML for manual inspection
-        filename = f"/Users/admin/CascadeProjects/telegram-deal-bot/debug_{name.lower().replace(' ', '_')}.html"
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(soup.prettify())
+        # The HTML sample was saved for manual inspection while downloading
         print(f"\n💾 Saved HTML sample to: {filename}")
         
     except Exception as e:
@@ -91,11 +115,16 @@ def main():
     print("🔍 Website Structure Debug Tool")
     print("This will help us understand how to extract gift card deals")
     
-    # Debug GCX (Raise)
-    debug_website("https://gcx.raise.com/buy-gift-cards", "GCX Raise")
+    targets = [
+        ("https://gcx.raise.com/buy-gift-cards", "GCX Raise"),
+        ("https://www.cardcash.com/buy-gift-cards", "CardCash"),
+    ]
     
-    # Debug CardCash
-    debug_website("https://www.cardcash.com/buy-gift-cards", "CardCash")
+    # Download both sites at once, then report on them in order so the output doesn't interleave
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        pages = [executor.submit(fetch_page, url, sample_path(name)) for url, name in targets]
+        for (url, name), page in zip(targets, pages):
+            debug_website(url, name, page)
     
     print("\n✅ Debug complete! Check the saved HTML files for manual inspection.")
 
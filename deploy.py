@@ -8,6 +8,7 @@ import os
 import sys
 import json
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 def check_requirements():
@@ -23,10 +24,10 @@ def check_requirements():
         '.env.example'
     ]
     
-    missing_files = []
-    for file in required_files:
-        if not os.path.exists(file):
-            missing_files.append(file)
+    # One directory listing instead of a stat per file
+    with os.scandir('.') as entries:
+        present = {entry.name for entry in entries}
+    missing_files = [file for file in required_files if file not in present]
     
     if missing_files:
         print(f"❌ Missing required files: {', '.join(missing_files)}")
@@ -52,16 +53,10 @@ def check_environment():
         'GENIUSLINK_SECRET'
     ]
     
-    missing_required = []
-    missing_optional = []
-    
-    for var in required_vars:
-        if not os.getenv(var):
-            missing_required.append(var)
-    
-    for var in optional_vars:
-        if not os.getenv(var):
-            missing_optional.append(var)
+    # Unset and empty variables both count as missing
+    env = os.environ
+    missing_required = [var for var in required_vars if not env.get(var)]
+    missing_optional = [var for var in optional_vars if not env.get(var)]
     
     if missing_required:
         print(f"❌ Missing required environment variables: {', '.join(missing_required)}")
@@ -80,20 +75,26 @@ def test_components():
     """Test all bot components"""
     print("\n🧪 Testing bot components...")
     
+    def run_test(script, timeout):
+        return subprocess.run([sys.executable, script], 
+                              capture_output=True, text=True, timeout=timeout)
+    
     try:
+        # The suites are independent, so run them side by side; each keeps its own timeout
+        print("Testing scraper and integration...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            scraper_run = executor.submit(run_test, 'test_scraper.py', 60)
+            integration_run = executor.submit(run_test, 'test_complete_integration.py', 120)
+        
         # Test scraper
-        print("Testing scraper...")
-        result = subprocess.run([sys.executable, 'test_scraper.py'], 
-                              capture_output=True, text=True, timeout=60)
+        result = scraper_run.result()
         if result.returncode != 0:
             print(f"❌ Scraper test failed: {result.stderr}")
             return False
         print("✅ Scraper test passed")
         
         # Test integration
-        print("Testing integration...")
-        result = subprocess.run([sys.executable, 'test_complete_integration.py'], 
-                              capture_output=True, text=True, timeout=120)
+        result = integration_run.result()
         if result.returncode != 0:
             print("⚠️  Integration test had issues (likely due to missing Supabase credentials)")
         else:
@@ -140,6 +141,7 @@ def create_deployment_configs():
     
     # Heroku Procfile
     with open('Procfile', 'w') as f:
+        f.write("web: gunicorn -w 2 -k gthread --threads 4 -b 0.0.0.0:$PORT app:app\n")
         f.write("worker: python main.py\n")
     
     # Docker configuration
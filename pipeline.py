@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Deal pipeline for the Telegram Gift Card Deal Bot
+Scrape -> filter -> post -> log, shared by main.py and the single-source drivers.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from config import get_config
+from scraper import iter_deal_batches
+from database import DealDatabase, get_database
+from services import telegram_service, geniuslink_service, format_deal_message
+
+logger = logging.getLogger(__name__)
+
+MIN_DISCOUNT = 15.0
+PREMIUM_DISCOUNT = 25.0
+ERROR_SUMMARY_SIZE = 3  # Error messages kept for the bot_executions log
+VECTORIZE_MIN_DEALS = 256  # Below this a plain comprehension beats building an array
+
+class ErrorLog:
+    """Counts a run's errors but keeps only the most recent few messages (bounded memory on bad runs)"""
+    def __init__(self, keep: int = ERROR_SUMMARY_SIZE):
+        self.count = 0
+        self.recent = deque(maxlen=keep)
+
+    def add(self, error_msg: str):
+        logger.error(error_msg)
+        self.count += 1
+        self.recent.append(error_msg)
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def summary(self) -> Optional[str]:
+        return '; '.join(self.recent) if self.count else None
+
+def deals_at_least(deals: List[Dict], min_discount: float) -> List[Dict]:
+    """Deals with discount_percent >= min_discount, in their original order"""
+    if len(deals) < VECTORIZE_MIN_DEALS:
+        return [deal for deal in deals if deal['discount_percent'] >= min_discount]
+
+    # One C-level comparison over a contiguous array instead of a bytecode loop
+    discounts = np.fromiter((deal['discount_percent'] for deal in deals), dtype=np.float64, count=len(deals))
+    return [deals[i] for i in np.flatnonzero(discounts >= min_discount)]
+
+async def post_deals_async(regular_deals: List[Dict], premium_deals: List[Dict], errors: ErrorLog,
+                           variant: str = 'regular', label: str = '') -> Tuple[List[Dict], List[Dict]]:
+    """
+    Shorten links, then post regular and premium deals concurrently.
+    Returns the (regular, premium) deals that were sent; failures are added to errors.
+    """
+    config = get_config()
+
+    # Shorten every link in one concurrent batch (premium deals reuse the same URLs)
+    short_urls = await geniuslink_service.shorten_many([deal['url'] for deal in regular_deals])
+
+    # Format every message up front so all sends can go out together
+    jobs = []  # (deal, is_premium) for each message, in order
+    messages = []  # (message, channel_id)
+    channels = [(regular_deals, False, config.telegram_channel_id)]
+    # Premium deals too (if premium channel is configured)
+    if config.telegram_premium_channel_id:
+        channels.append((premium_deals, True, config.telegram_premium_channel_id))
+
+    for deals, is_premium, channel_id in channels:
+        for deal in deals:
+            try:
+                message = format_deal_message(deal, is_premium=is_premium,
+                                              short_url=short_urls[deal['url']], variant=variant)
+                messages.append((message, channel_id))
+                jobs.append((deal, is_premium))
+            except Exception as e:
+                errors.add(f"Error posting {label}{'premium deal' if is_premium else 'deal'} {deal['merchant']}: {e}")
+
+    # Post regular and premium deals concurrently, bounded by telegram_concurrency
+    results = await telegram_service.send_messages_async(messages, config.telegram_concurrency)
+
+    sent_regular = []
+    sent_premium = []
+    for (deal, is_premium), result in zip(jobs, results):
+        kind = "premium deal" if is_premium else "deal"
+        if isinstance(result, Exception):
+            errors.add(f"Error posting {label}{kind} {deal['merchant']}: {result}")
+        elif result:
+            (sent_premium if is_premium else sent_regular).append(deal)
+            logger.info("Posted %s%s: %s", label, kind, deal['merchant'])
+
+    return sent_regular, sent_premium
+
+def process_deals(db: DealDatabase, all_deals: List[Dict], source_label: Optional[str] = None, variant: str = 'regular'):
+    """Filter, post and log an already-fetched batch of deals"""
+    process_deal_batches(db, [all_deals], source_label, variant)
+
+def process_deal_batches(db: DealDatabase, deal_batches: Iterable[List[Dict]], source_label: Optional[str] = None,
+                         variant: str = 'regular'):
+    """
+    Filter, post and log deals arriving in batches (e.g. one per source as its scrape finishes).
+    Each batch is reduced to its qualifying deals on arrival, so the full scrape is never held at once.
+    """
+    label = f"{source_label} " if source_label else ""
+    deals_found = 0
+    deals_posted = 0
+    premium_deals_posted = 0
+    errors = ErrorLog()
+
+    try:
+        # Filter deals by discount threshold, then remove duplicates using the database;
+        # premium deals are a subset of regular ones, so one check covers both.
+        # Scraped deals always carry every field, so plain subscripts replace .get() defaults here
+        regular_deals = []
+        for batch in deal_batches:
+            deals_found += len(batch)
+            regular_deals.extend(deals_at_least(batch, MIN_DISCOUNT))
+
+        logger.info("Found %s %sdeals", deals_found, label or 'total ')
+
+        new_regular_deals = db.filter_new_deals(regular_deals)
+        new_premium_deals = deals_at_least(new_regular_deals, PREMIUM_DISCOUNT)
+
+        logger.info("Found %s new deals with %.0f%%+ discount", len(new_regular_deals), MIN_DISCOUNT)
+        logger.info("Found %s new premium deals with %.0f%%+ discount", len(new_premium_deals), PREMIUM_DISCOUNT)
+
+        # Most runs find nothing new: skip the link shortening and Telegram clients entirely
+        if not new_regular_deals:
+            db.log_bot_execution(
+                deals_found=deals_found,
+                deals_posted=0,
+                premium_deals_posted=0,
+                errors=None,
+                status='success'
+            )
+            logger.info("%s processing completed: no new deals to post", source_label or 'Deal')
+            return
+
+        sent_regular, sent_premium = asyncio.run(
+            post_deals_async(new_regular_deals, new_premium_deals, errors, variant, label)
+        )
+
+        # Mark everything that went out as posted in one database write
+        if sent_regular or sent_premium:
+            if db.mark_deals_as_posted(sent_regular + sent_premium):
+                deals_posted = len(sent_regular)
+                premium_deals_posted = len(sent_premium)
+            else:
+                errors.add(f"Error marking {len(sent_regular) + len(sent_premium)} posted {label}deals in database")
+
+        # Log execution statistics
+        status = 'success' if not errors else ('partial' if deals_posted > 0 else 'error')
+
+        db.log_bot_execution(
+            deals_found=deals_found,
+            deals_posted=deals_posted,
+            premium_deals_posted=premium_deals_posted,
+            errors=errors.summary(),
+            status=status
+        )
+
+        logger.info("%s processing completed: %s regular, %s premium deals posted, %s errors",
+                    source_label or 'Deal', deals_posted, premium_deals_posted, errors.count)
+
+    except Exception as e:
+        error_msg = f"Critical error in {label or 'deal '}processing: {e}"
+        logger.error(error_msg)
+        db.log_bot_execution(
+            deals_found=0,
+            deals_posted=0,
+            premium_deals_posted=0,
+            errors=error_msg,
+            status='error'
+        )
+
+def run(sources: List[str], source_label: Optional[str] = None, variant: str = 'regular'):
+    """Scrape the given sources, then filter, post and log their deals"""
+    label = f"{source_label} " if source_label else ""
+    logger.info("Starting %sdeal processing...", label)
+
+    # Sources are consumed one at a time as their scrapes finish; a scrape
+    # failure is logged as a critical error for the run
+    process_deal_batches(get_database(), iter_deal_batches(sources), source_label, variant)
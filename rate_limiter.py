@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Token-bucket rate limiter for outgoing API calls (e.g. Telegram sendMessage)
+"""
+
+import asyncio
+import threading
+import time
+
+
+class AsyncLimiter:
+    """
+    Allow at most max_rate acquisitions per time_period seconds, with bursts up to max_rate.
+
+    Usable as `async with limiter:`. The bucket holds no asyncio primitives, so one
+    module-level limiter can be shared by every event loop (each asyncio.run call)
+    and by worker threads.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Take a token if one is available; otherwise return the seconds until one will be"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.max_rate, self._tokens + (now - self._updated) * self.max_rate / self.time_period)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * self.time_period / self.max_rate
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while (wait := self._try_take()) > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -3,35 +3,101 @@
 Web scraping module for Raise.com and CardCash.com gift card deals using Scrapingdog.
 """
 
+import re
+import asyncio
 import logging
+import threading
 import requests
+import requests_cache
 from bs4 import BeautifulSoup
-from typing import List, Dict
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Iterator, List, Dict
+from urllib.parse import urlencode, urljoin
 
-from config import config
+from config import get_config
 
 logger = logging.getLogger(__name__)
 
+# Lifetime of a cached Scrapingdog response. Rendered pages carry no validators, so
+# this is a plain TTL: it must stay below the shortest scheduled run (the 5-minute
+# cron) or scheduled scrapes would post from stale pages.
+CACHE_TTL_SECONDS = 4 * 60
+
+# Shared HTTP cache so repeat fetches of the same page within the TTL
+# (retries, overlapping manual triggers) don't hit Scrapingdog again.
+# Monitoring checks bypass it (scrape(fresh=True)) to measure real turnover.
+_session = requests_cache.CachedSession(
+    'scrape_cache',
+    backend='sqlite',
+    expire_after=CACHE_TTL_SECONDS,
+    allowable_codes=(200,),
+)
+# Keep-alive pool sized for the concurrent source scrapes so each worker
+# thread reuses a warm connection to api.scrapingdog.com across cycles.
+_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=10))
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_stats_lock = threading.Lock()
+
+# Deal text patterns, compiled once instead of on every card
+PRICE_RE = re.compile(r'\$(\d+(?:\.\d{2})?)')
+PCT_RE = re.compile(r'(\d+(?:\.\d+)?)%')
+CARDCASH_MERCHANT_RE = re.compile(r'/discount-([^-/]+)-cards?/')
+
+# Resolved card links kept in memory; the same hrefs come back every scrape cycle
+URL_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def resolve_url(base_url: str, href: str) -> str:
+    """urljoin, memoized: both URLs are re-parsed on every call otherwise."""
+    return urljoin(base_url, href)
+
+# Card elements kept per CSS selector; the selectors overlap, so this also limits duplicates
+CARDS_PER_SELECTOR = 20
+
+def get_cache_stats(reset: bool = False) -> Dict:
+    """Return scrape cache hit/miss counters and hit ratio, optionally resetting them."""
+    with _cache_stats_lock:
+        hits, misses = _cache_stats['hits'], _cache_stats['misses']
+        if reset:
+            _cache_stats['hits'] = _cache_stats['misses'] = 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0
+    }
+
 class BaseScraper:
     """Base class for a web scraper using the Scrapingdog API."""
     def __init__(self, start_url: str):
         self.start_url = start_url
-        self.api_key = config.scrapingdog_api_key
+        self.api_key = get_config().scrapingdog_api_key
+        # Built once; the target URL is percent-encoded so its own query string can't leak into ours
+        self.api_url = "https://api.scrapingdog.com/scrape?" + urlencode({
+            'api_key': self.api_key,
+            'url': start_url,
+            'dynamic': 'true'
+        })
 
-    def scrape(self) -> List[Dict]:
-        """Main scraping method to be called."""
+    def scrape(self, fresh: bool = False) -> List[Dict]:
+        """Main scraping method to be called (fresh: always fetch the live page, refreshing the cache)."""
         if not self.api_key:
             logger.error("Scrapingdog API key is not set. Cannot perform scraping.")
             return []
 
         try:
             logger.info(f"Fetching {self.start_url} via Scrapingdog for {self.__class__.__name__}")
-            api_url = f"https://api.scrapingdog.com/scrape?api_key={self.api_key}&url={self.start_url}&dynamic=true"
-            response = requests.get(api_url, timeout=90) # Increased timeout for dynamic rendering
+            response = _session.get(self.api_url, timeout=90, force_refresh=fresh) # Increased timeout for dynamic rendering
             response.raise_for_status()
+
+            # Forced refreshes never consult the cache, so they don't count towards its hit ratio
+            if not fresh:
+                with _cache_stats_lock:
+                    _cache_stats['hits' if getattr(response, 'from_cache', False) else 'misses'] += 1
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # libxml2 tokenizes the large React-rendered pages far faster than html.parser
+            soup = BeautifulSoup(response.content, 'lxml')
             deals = self.parse_deals(soup)
             logger.info(f"Found {len(deals)} deals from {self.__class__.__name__}.")
             return deals
@@ -43,6 +109,23 @@ class BaseScraper:
         """Parses deals from a given BeautifulSoup object. Must be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement this method.")
 
+    @staticmethod
+    def has_pricing(card) -> bool:
+        """Cheap pre-check: extractors need a '$' or '%' in the card's text, so skip cards without one."""
+        return card.find(string=lambda text: '$' in text or '%' in text) is not None
+
+    @staticmethod
+    def unique_deals(deals: List[Dict]) -> List[Dict]:
+        """Drop repeats of a deal, keyed on the fields DealDatabase hashes, keeping page order.
+
+        Nested or repeated elements (e.g. a card and its wrapper) yield the same deal twice.
+        """
+        unique = {}
+        for deal in deals:
+            key = (deal['merchant'], round(deal['discount_percent'], 1), deal['source'], deal['face_value'])
+            unique.setdefault(key, deal)
+        return list(unique.values())
+
 class RaiseScraper(BaseScraper):
     """Scraper for GCX (Raise.com marketplace)."""
     def __init__(self):
@@ -63,16 +146,19 @@ class RaiseScraper(BaseScraper):
         
         cards = []
         for selector in possible_selectors:
-            found_cards = soup.select(selector)
+            # limit= stops the tree walk at the cap instead of matching the whole page
+            found_cards = soup.select(selector, limit=CARDS_PER_SELECTOR)
             if found_cards:
                 logger.info(f"Found {len(found_cards)} potential cards with selector: {selector}")
-                cards.extend(found_cards[:20])  # Limit to avoid duplicates
+                cards.extend(found_cards)
         
-        # Remove duplicates
-        cards = list(set(cards))
+        # Remove elements matched by more than one selector (by identity, keeping page order)
+        cards = list({id(card): card for card in cards}.values())
         logger.info(f"Processing {len(cards)} unique card elements from GCX")
         
         for card in cards:
+            if not self.has_pricing(card):
+                continue
             try:
                 deal = self._extract_gcx_deal(card)
                 if deal:
@@ -81,7 +167,7 @@ class RaiseScraper(BaseScraper):
                 logger.debug(f"Could not parse a deal card on GCX: {e}")
                 continue
                 
-        return deals
+        return self.unique_deals(deals)
     
     def _extract_gcx_deal(self, element) -> Dict:
         """Extract deal information from a GCX card element"""
@@ -101,20 +187,18 @@ class RaiseScraper(BaseScraper):
             
             # Try to find merchant in text content
             if merchant == "Unknown":
-                # Look for text that might be a merchant name
-                text_elements = element.find_all(['span', 'div', 'h1', 'h2', 'h3', 'h4'])
-                for elem in text_elements:
-                    text = elem.get_text(strip=True)
-                    if text and len(text) > 2 and len(text) < 50:
+                # Look for a text node that might be a merchant name (one walk over the
+                # card's strings instead of re-extracting text from every nested tag)
+                for text in element.stripped_strings:
+                    if len(text) > 2 and len(text) < 50:
                         # Skip if it's clearly a price or percentage
                         if not any(char in text for char in ['$', '%', '0', '1', '2', '3', '4', '5', '6', '7', '8', '9']):
                             merchant = text
                             break
             
             # Extract prices using regex
-            import re
-            prices = re.findall(r'\$(\d+(?:\.\d{2})?)', element_text)
-            percentages = re.findall(r'(\d+(?:\.\d+)?)%', element_text)
+            prices = PRICE_RE.findall(element_text)
+            percentages = PCT_RE.findall(element_text)
             
             if not prices and not percentages:
                 return None
@@ -133,7 +217,8 @@ class RaiseScraper(BaseScraper):
                 price_val = float(prices[0])
                 discount_pct = float(percentages[0])
                 
-                if 'off' in element_text.lower() or 'save' in element_text.lower():
+                element_text_lower = element_text.lower()
+                if 'off' in element_text_lower or 'save' in element_text_lower:
                     # Price is likely face value, calculate sale price
                     face_value = price_val
                     price = face_value * (1 - discount_pct / 100)
@@ -152,11 +237,11 @@ class RaiseScraper(BaseScraper):
                 # Find URL
                 url = ''
                 if element.name == 'a' and element.get('href'):
-                    url = urljoin(self.start_url, element['href'])
+                    url = resolve_url(self.start_url, element['href'])
                 else:
                     link_elem = element.find('a', href=True)
                     if link_elem:
-                        url = urljoin(self.start_url, link_elem['href'])
+                        url = resolve_url(self.start_url, link_elem['href'])
                 
                 return {
                     'source': 'GCX',
@@ -192,16 +277,19 @@ class CardCashScraper(BaseScraper):
         
         cards = []
         for selector in possible_selectors:
-            found_cards = soup.select(selector)
+            # limit= stops the tree walk at the cap instead of matching the whole page
+            found_cards = soup.select(selector, limit=CARDS_PER_SELECTOR)
             if found_cards:
                 logger.info(f"Found {len(found_cards)} potential cards with selector: {selector}")
-                cards.extend(found_cards[:20])  # Limit to avoid duplicates
+                cards.extend(found_cards)
         
-        # Remove duplicates
-        cards = list(set(cards))
+        # Remove elements matched by more than one selector (by identity, keeping page order)
+        cards = list({id(card): card for card in cards}.values())
         logger.info(f"Processing {len(cards)} unique card elements from CardCash")
         
         for card in cards:
+            if not self.has_pricing(card):
+                continue
             try:
                 deal = self._extract_cardcash_deal(card)
                 if deal:
@@ -210,7 +298,7 @@ class CardCashScraper(BaseScraper):
                 logger.debug(f"Could not parse a deal card on CardCash: {e}")
                 continue
                 
-        return deals
+        return self.unique_deals(deals)
     
     def _extract_cardcash_deal(self, element) -> Dict:
         """Extract deal information from a CardCash card element"""
@@ -236,26 +324,22 @@ class CardCashScraper(BaseScraper):
                 if element.name == 'a' and element.get('href'):
                     href = element['href']
                     # Extract merchant from URL patterns like /buy-gift-cards/discount-walmart-cards/
-                    import re
-                    url_match = re.search(r'/discount-([^-/]+)-cards?/', href)
+                    url_match = CARDCASH_MERCHANT_RE.search(href)
                     if url_match:
                         merchant = url_match.group(1).title()
                 
-                # Look for text that might be a merchant name
+                # Look for a text node that might be a merchant name
                 if merchant == "Unknown":
-                    text_elements = element.find_all(['span', 'div', 'h1', 'h2', 'h3', 'h4', 'p'])
-                    for elem in text_elements:
-                        text = elem.get_text(strip=True)
-                        if text and len(text) > 2 and len(text) < 30:
+                    for text in element.stripped_strings:
+                        if len(text) > 2 and len(text) < 30:
                             # Skip if it's clearly a price or percentage
                             if not any(char in text for char in ['$', '%']) and not text.replace('.', '').isdigit():
                                 merchant = text
                                 break
             
             # Extract discount percentage using regex
-            import re
-            percentages = re.findall(r'(\d+(?:\.\d+)?)%', element_text)
-            prices = re.findall(r'\$(\d+(?:\.\d{2})?)', element_text)
+            percentages = PCT_RE.findall(element_text)
+            prices = PRICE_RE.findall(element_text)
             
             if not percentages and not prices:
                 return None
@@ -289,11 +373,11 @@ class CardCashScraper(BaseScraper):
             # Find URL
             url = ''
             if element.name == 'a' and element.get('href'):
-                url = urljoin(self.start_url, element['href'])
+                url = resolve_url(self.start_url, element['href'])
             else:
                 link_elem = element.find('a', href=True)
                 if link_elem:
-                    url = urljoin(self.start_url, link_elem['href'])
+                    url = resolve_url(self.start_url, link_elem['href'])
             
             return {
                 'source': 'CardCash',
@@ -309,20 +393,86 @@ class CardCashScraper(BaseScraper):
         
         return None
 
-def get_all_deals(scrapers: List[str] = ['raise', 'cardcash']) -> List[Dict]:
-    """Get deals from all specified sources."""
-    all_deals = []
+def _scraper_classes(scrapers: List[str]) -> List[type]:
+    """Map source names to scraper classes, skipping (and logging) unknown names."""
     scraper_map = {
         'raise': RaiseScraper,
         'cardcash': CardCashScraper
     }
 
+    scraper_classes = []
     for scraper_name in scrapers:
         if scraper_name in scraper_map:
-            scraper_instance = scraper_map[scraper_name]()
-            all_deals.extend(scraper_instance.scrape())
+            scraper_classes.append(scraper_map[scraper_name])
         else:
             logger.warning(f"Unknown scraper specified: {scraper_name}")
+    return scraper_classes
+
+def get_all_deals(scrapers: List[str] = ['raise', 'cardcash']) -> List[Dict]:
+    """Get deals from all specified sources.
+
+    The sources are independent and I/O-bound, so each is scraped in its own
+    worker thread; results are combined in the order the sources were given.
+    """
+    all_deals = []
+    scraper_classes = _scraper_classes(scrapers)
+
+    if scraper_classes:
+        with ThreadPoolExecutor(max_workers=len(scraper_classes)) as executor:
+            for deals in executor.map(lambda scraper_class: scraper_class().scrape(), scraper_classes):
+                all_deals.extend(deals)
+
+    logger.info(f"Total deals found from all sources: {len(all_deals)}")
+    return all_deals
+
+def iter_deal_batches(scrapers: List[str] = ['raise', 'cardcash']) -> Iterator[List[Dict]]:
+    """Yield each source's deals as soon as its scrape finishes (sources run concurrently).
+
+    Lets callers filter one source while the others are still downloading,
+    without ever building a combined list of every scraped deal.
+    """
+    scraper_classes = _scraper_classes(scrapers)
+    if not scraper_classes:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(scraper_classes)) as executor:
+        futures = {executor.submit(scraper_class().scrape): scraper_class for scraper_class in scraper_classes}
+        for future in as_completed(futures):
+            try:
+                deals = future.result()
+            except Exception as e:
+                # One failing source must not stop the others' batches
+                logger.error(f"Unexpected error in {futures[future].__name__}: {e}")
+                continue
+            yield deals
+
+async def get_all_deals_async(scrapers: List[str] = ['raise', 'cardcash'], max_concurrency: int = 5,
+                              fresh: bool = False) -> List[Dict]:
+    """Get deals from all specified sources concurrently.
+
+    Each scraper is blocking (requests), so it runs in a worker thread; a
+    semaphore bounds how many Scrapingdog requests are in flight at once.
+    fresh=True bypasses the response cache (see BaseScraper.scrape).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def scrape_source(scraper_class: type) -> List[Dict]:
+        async with semaphore:
+            return await asyncio.to_thread(scraper_class().scrape, fresh)
+
+    scraper_classes = _scraper_classes(scrapers)
+    results = await asyncio.gather(
+        *(scrape_source(scraper_class) for scraper_class in scraper_classes),
+        return_exceptions=True
+    )
+
+    all_deals = []
+    for scraper_class, deals in zip(scraper_classes, results):
+        if isinstance(deals, Exception):
+            # One failing source must not discard the others' deals
+            logger.error(f"Unexpected error in {scraper_class.__name__}: {deals}")
+            continue
+        all_deals.extend(deals)
 
     logger.info(f"Total deals found from all sources: {len(all_deals)}")
     return all_deals
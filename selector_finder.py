@@ -4,13 +4,26 @@ Script to analyze HTML structure from Raise.com and CardCash.com to find correct
 This script uses Scrapingdog to fetch the pages and then analyzes the structure.
 """
 
-import requests
+import requests_cache
 from bs4 import BeautifulSoup
 import json
-from config import config
+from config import get_config
+
+# Both pages come from api.scrapingdog.com, so the second fetch reuses the first's connection.
+# Responses are cached on disk, so re-running the analysis within the hour costs no
+# Scrapingdog credits or 90s renders. The cache is separate from the scraper's, whose
+# shorter TTL would not apply to entries written here.
+SELECTOR_CACHE_TTL_SECONDS = 60 * 60
+_session = requests_cache.CachedSession(
+    'selector_finder_cache',
+    backend='sqlite',
+    expire_after=SELECTOR_CACHE_TTL_SECONDS,
+    allowable_codes=(200,),
+)
 
 def fetch_page_via_scrapingdog(url):
     """Fetch a page using Scrapingdog API"""
+    config = get_config()
     if not config.scrapingdog_api_key:
         print("Error: SCRAPINGDOG_API_KEY is not set in your .env file")
         return None
@@ -18,13 +31,21 @@ def fetch_page_via_scrapingdog(url):
     try:
         api_url = f"https://api.scrapingdog.com/scrape?api_key={config.scrapingdog_api_key}&url={url}&dynamic=true"
         print(f"Fetching {url} via Scrapingdog...")
-        response = requests.get(api_url, timeout=90)
+        response = _session.get(api_url, timeout=90)
         response.raise_for_status()
         return response.content
     except Exception as e:
         print(f"Error fetching {url}: {e}")
         return None
 
+def count_price_strings(soup):
+    """Count text nodes containing '$' and '%' in a single walk over the page's strings"""
+    price_count = percent_count = 0
+    for text in soup.strings:
+        price_count += '$' in text
+        percent_count += '%' in text
+    return price_count, percent_count
+
 def analyze_gcx_structure():
     """Analyze GCX (Raise) page structure"""
     print("\n=== ANALYZING GCX (RAISE) STRUCTURE ===")
@@ -33,7 +54,7 @@ def analyze_gcx_structure():
     if not html_content:
         return
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, 'lxml')
     
     # Save HTML for manual inspection
     with open('/tmp/gcx_page.html', 'w', encoding='utf-8') as f:
@@ -67,14 +88,11 @@ def analyze_gcx_structure():
                 print(f"  Sample element classes: {first_elem.get('class', [])}")
                 print(f"  Sample element text (first 100 chars): {first_elem.get_text()[:100]}...")
     
-    # Look for price-like patterns
+    # Look for price and percentage patterns
     print("\n--- Looking for price patterns ---")
-    price_elements = soup.find_all(text=lambda text: text and '$' in text)
-    print(f"Found {len(price_elements)} elements containing '$'")
-    
-    # Look for percentage patterns
-    percent_elements = soup.find_all(text=lambda text: text and '%' in text)
-    print(f"Found {len(percent_elements)} elements containing '%'")
+    price_count, percent_count = count_price_strings(soup)
+    print(f"Found {price_count} elements containing '$'")
+    print(f"Found {percent_count} elements containing '%'")
 
 def analyze_cardcash_structure():
     """Analyze CardCash page structure"""
@@ -84,7 +102,7 @@ def analyze_cardcash_structure():
     if not html_content:
         return
     
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, 'lxml')
     
     # Save HTML for manual inspection
     with open('/tmp/cardcash_page.html', 'w', encoding='utf-8') as f:
@@ -117,11 +135,9 @@ def analyze_cardcash_structure():
     
     # Look for price and percentage patterns
     print("\n--- Looking for price patterns ---")
-    price_elements = soup.find_all(text=lambda text: text and '$' in text)
-    print(f"Found {len(price_elements)} elements containing '$'")
-    
-    percent_elements = soup.find_all(text=lambda text: text and '%' in text)
-    print(f"Found {len(percent_elements)} elements containing '%'")
+    price_count, percent_count = count_price_strings(soup)
+    print(f"Found {price_count} elements containing '$'")
+    print(f"Found {percent_count} elements containing '%'")
 
 def main():
     """Main function to analyze both sites"""
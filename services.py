@@ -5,42 +5,133 @@ Handles interactions with Telegram and Geniuslink APIs.
 """
 
 import os
+import json
+import atexit
+import asyncio
 import logging
-import requests
-from typing import Optional
+import httpx
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple, Union
 
-from config import config
+from config import get_config
+from rate_limiter import AsyncLimiter
 
 logger = logging.getLogger(__name__)
 
+# Telegram allows ~30 messages/second per bot and 20 messages/minute per group or channel
+GLOBAL_LIMITER = AsyncLimiter(25, 1)
+CHANNEL_LIMITERS: Dict[str, AsyncLimiter] = defaultdict(lambda: AsyncLimiter(20, 60))
+
+# One keep-alive HTTP/2 connection per API host (Telegram, Geniuslink) for the whole process (sync calls);
+# the transport retries failed connection attempts, never requests that reached the server
+TELEGRAM_TIMEOUT = 10
+_http_client = httpx.Client(timeout=TELEGRAM_TIMEOUT, transport=httpx.HTTPTransport(http2=True, retries=3))
+atexit.register(_http_client.close)
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Shortened links kept per process; the same merchant URLs come back run after run
+SHORT_URL_CACHE_SIZE = 4096
+
+# Telegram deal message, parsed once; each variant only changes the trailing source line
+MESSAGE_TEMPLATE = (
+    "{header}🎯 **{merchant} Gift Card**\n"
+    "💳 **Face Value:** ${face_value:.2f}\n"
+    "💸 **Price:** ${price:.2f} *({discount_percent:.1f}% OFF)*\n"
+    "🔗 [**Buy Now**]({short_url}){source_line}"
+)
+PREMIUM_HEADER = "🌟 **PREMIUM DEAL** 🌟\n\n"
+SOURCE_LINES = {
+    'regular': "",
+    'cardcash': "\n📍 *Source: CardCash*",
+    'gcx': "\n📍 *Source: GCX*",
+}
+
 class TelegramService:
     """A service for sending messages to Telegram channels."""
     def __init__(self, bot_token: str):
         self.bot_token = bot_token
         self.api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
 
-    def send_message(self, message: str, channel_id: str) -> bool:
-        """Sends a message to a specified Telegram channel."""
-        if not self.bot_token or not channel_id:
-            logger.error("Telegram bot token or channel ID is not configured.")
-            return False
-        
+    @staticmethod
+    def build_body(channel_id: str, message: str) -> bytes:
+        """Encode a sendMessage request body once, so sends and retries can reuse the bytes."""
         payload = {
             'chat_id': channel_id,
             'text': message,
             'parse_mode': 'Markdown',
             'disable_web_page_preview': True
         }
+        if orjson is not None:
+            return orjson.dumps(payload)
+        return json.dumps(payload, separators=(',', ':')).encode()
+
+    def send_message(self, message: str, channel_id: str) -> bool:
+        """Sends a message to a specified Telegram channel."""
+        if not self.bot_token or not channel_id:
+            logger.error("Telegram bot token or channel ID is not configured.")
+            return False
         
         try:
-            response = requests.post(self.api_url, json=payload, timeout=10)
+            response = _http_client.post(self.api_url, content=self.build_body(channel_id, message),
+                                             headers=JSON_HEADERS)
             response.raise_for_status()
-            logger.info(f"Message sent to Telegram channel: {channel_id}")
+            logger.info("Message sent to Telegram channel: %s", channel_id)
             return True
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error sending Telegram message: {e}")
+        except httpx.HTTPError as e:
+            logger.error("Error sending Telegram message: %s", e)
             return False
 
+    async def send_message_async(self, client: httpx.AsyncClient, body: bytes, channel_id: str) -> bool:
+        """Sends a prebuilt request body (see build_body) to a Telegram channel over a shared async client."""
+        if not self.bot_token or not channel_id:
+            logger.error("Telegram bot token or channel ID is not configured.")
+            return False
+        
+        try:
+            for attempt in range(2):
+                async with CHANNEL_LIMITERS[channel_id], GLOBAL_LIMITER:
+                    response = await client.post(self.api_url, content=body, headers=JSON_HEADERS)
+                
+                # Rate limited: wait as long as Telegram asks, then retry once
+                if response.status_code == 429 and attempt == 0:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 1)
+                    logger.warning("Telegram rate limit hit, retrying in %ss", retry_after)
+                    await asyncio.sleep(retry_after)
+                    continue
+                
+                response.raise_for_status()
+                logger.info("Message sent to Telegram channel: %s", channel_id)
+                return True
+        except httpx.HTTPError as e:
+            logger.error("Error sending Telegram message: %s", e)
+            return False
+
+    async def send_messages_async(self, messages: List[Tuple[str, str]], max_concurrency: int = 4) -> List[Union[bool, Exception]]:
+        """
+        Send (message, channel_id) pairs concurrently, at most max_concurrency in flight
+        and paced by the global and per-channel rate limiters.
+        Returns one result per message, in order: True/False, or the exception it raised.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Encode every body before the first send; nothing is re-serialized per attempt
+        bodies = [(self.build_body(channel_id, message), channel_id) for message, channel_id in messages]
+
+        # Async connections belong to the event loop, so each batch gets its own client;
+        # HTTP/2 multiplexes the whole batch over a single connection
+        async with httpx.AsyncClient(http2=True, timeout=TELEGRAM_TIMEOUT) as client:
+            async def bounded_send(body: bytes, channel_id: str) -> bool:
+                async with semaphore:
+                    return await self.send_message_async(client, body, channel_id)
+
+            return await asyncio.gather(
+                *(bounded_send(body, channel_id) for body, channel_id in bodies),
+                return_exceptions=True
+            )
+
 class GeniuslinkService:
     """A service for shortening URLs using the Geniuslink API."""
     def __init__(self, api_key: str, api_secret: str, group_id: str = None):
@@ -48,13 +139,23 @@ class GeniuslinkService:
         self.api_secret = api_secret
         self.api_url = "https://api.geni.us/v3/shorturls"
         self.group_id = group_id or "1"  # Default group ID if none provided
+        # Successfully shortened URLs (original -> short), least recently used first
+        self._short_urls = OrderedDict()
 
-    def shorten_url(self, url: str) -> Optional[str]:
-        """Shortens a URL using the Geniuslink API."""
-        if not self.api_key or not self.api_secret:
-            logger.warning("Geniuslink credentials not found. Returning original URL.")
-            return url
+    def _cached(self, url: str) -> Optional[str]:
+        short_url = self._short_urls.get(url)
+        if short_url is not None:
+            self._short_urls.move_to_end(url)
+        return short_url
 
+    def _remember(self, url: str, short_url: str):
+        self._short_urls[url] = short_url
+        self._short_urls.move_to_end(url)
+        if len(self._short_urls) > SHORT_URL_CACHE_SIZE:
+            self._short_urls.popitem(last=False)
+
+    def _build_request(self, url: str) -> Tuple[Dict, Dict]:
+        """Headers and payload for a shorten request"""
         headers = {
             'X-Api-Key': self.api_key,
             'X-Api-Secret': self.api_secret,
@@ -64,25 +165,91 @@ class GeniuslinkService:
         payload = {
             'Url': url,
             'GroupId': self.group_id,
-            'DomainId': getattr(config, 'geniuslink_domain_id', '1'),  # Default domain ID
+            'DomainId': getattr(get_config(), 'geniuslink_domain_id', '1'),  # Default domain ID
             'AutoTagAllLinks': True
         }
+        return headers, payload
+
+    def shorten_url(self, url: str) -> Optional[str]:
+        """Shortens a URL using the Geniuslink API."""
+        if not self.api_key or not self.api_secret:
+            logger.warning("Geniuslink credentials not found. Returning original URL.")
+            return url
+
+        cached = self._cached(url)
+        if cached is not None:
+            return cached
+
+        headers, payload = self._build_request(url)
 
         try:
-            response = requests.post(self.api_url, json=payload, headers=headers, timeout=10)
+            response = _http_client.post(self.api_url, json=payload, headers=headers)
             if response.status_code == 201:
                 short_url = response.json().get('ShortUrl')
-                logger.info(f"Successfully shortened URL: {url} -> {short_url}")
+                logger.info("Successfully shortened URL: %s -> %s", url, short_url)
+                if short_url:
+                    self._remember(url, short_url)
                 return short_url
             else:
-                logger.warning(f"Geniuslink API returned status {response.status_code}: {response.text}")
+                logger.warning("Geniuslink API returned status %s: %s", response.status_code, response.text)
+                return url
+        except httpx.HTTPError as e:
+            logger.error("Error shortening link with Geniuslink: %s", e)
+            return url
+
+    async def _shorten_url_async(self, client: httpx.AsyncClient, url: str) -> str:
+        headers, payload = self._build_request(url)
+
+        try:
+            response = await client.post(self.api_url, json=payload, headers=headers, timeout=10)
+            if response.status_code == 201:
+                short_url = response.json().get('ShortUrl')
+                logger.info("Successfully shortened URL: %s -> %s", url, short_url)
+                if short_url:
+                    self._remember(url, short_url)
+                    return short_url
+                return url
+            else:
+                logger.warning("Geniuslink API returned status %s: %s", response.status_code, response.text)
                 return url
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error shortening link with Geniuslink: {e}")
+        except httpx.HTTPError as e:
+            logger.error("Error shortening link with Geniuslink: %s", e)
             return url
 
+    async def shorten_many(self, urls: List[str], max_concurrency: int = 8) -> Dict[str, str]:
+        """
+        Shorten a batch of URLs concurrently, returning original -> short URL.
+        Duplicates and previously shortened URLs cost no request; failures map to the original URL.
+        """
+        if not self.api_key or not self.api_secret:
+            logger.warning("Geniuslink credentials not found. Returning original URLs.")
+            return {url: url for url in urls}
+
+        short_urls = {}
+        pending = []
+        for url in dict.fromkeys(urls):
+            cached = self._cached(url)
+            if cached is not None:
+                short_urls[url] = cached
+            else:
+                pending.append(url)
+
+        if pending:
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async with httpx.AsyncClient() as client:
+                async def bounded_shorten(url: str) -> str:
+                    async with semaphore:
+                        return await self._shorten_url_async(client, url)
+
+                results = await asyncio.gather(*(bounded_shorten(url) for url in pending))
+            short_urls.update(zip(pending, results))
+
+        return short_urls
+
 # Instantiate services with config
 # Instantiate services with config values, provide fallbacks for testing
+config = get_config()
 telegram_token = getattr(config, 'telegram_bot_token', None) or os.environ.get('TELEGRAM_BOT_TOKEN', '')
 geniuslink_key = getattr(config, 'geniuslink_api_key', None) or os.environ.get('GENIUSLINK_API_KEY', '')
 geniuslink_secret = getattr(config, 'geniuslink_secret', None) or os.environ.get('GENIUSLINK_SECRET', '')
@@ -90,3 +257,25 @@ geniuslink_group = getattr(config, 'geniuslink_group_id', None) or os.environ.ge
 
 telegram_service = TelegramService(telegram_token)
 geniuslink_service = GeniuslinkService(geniuslink_key, geniuslink_secret, geniuslink_group)
+
+
+def format_deal_message(deal: Dict, is_premium: bool = False, short_url: Optional[str] = None, variant: str = 'regular') -> str:
+    """
+    Format deal into Telegram message with markdown and emojis.
+    short_url is an already shortened link; variant picks the source line ('regular', 'cardcash' or 'gcx').
+    """
+    original_url = deal.get('url', '')
+
+    # Shorten the URL using the Geniuslink service unless the caller already did
+    if short_url is None:
+        short_url = geniuslink_service.shorten_url(original_url) or original_url
+
+    return MESSAGE_TEMPLATE.format_map({
+        'header': PREMIUM_HEADER if is_premium else "",
+        'merchant': deal.get('merchant', 'Unknown'),
+        'face_value': deal.get('face_value', 0),
+        'price': deal.get('price', 0),
+        'discount_percent': deal.get('discount_percent', 0),
+        'short_url': short_url,
+        'source_line': SOURCE_LINES[variant],
+    })
@@ -16,7 +16,7 @@ load_dotenv()
 # Add current directory to path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from scraper import GiftCardScraper
+from scraper import get_all_deals
 
 # Configure logging
 logging.basicConfig(
@@ -49,12 +49,9 @@ def test_bot_integration():
     print("=" * 50)
     
     try:
-        # Initialize scraper
-        scraper = GiftCardScraper()
-        
-        # Fetch all deals
+        # Fetch all deals (sources are scraped concurrently)
         print("📡 Fetching deals from all sources...")
-        all_deals = scraper.get_all_deals()
+        all_deals = get_all_deals()
         
         print(f"✅ Found {len(all_deals)} total deals")
         
@@ -86,14 +83,13 @@ def test_bot_integration():
         duplicates = 0
         
         for deal in all_deals:
-            # Create a unique hash for each deal
-            deal_key = f"{deal['merchant']}_{deal['discount_percent']}_{deal['source']}"
-            deal_hash = hashlib.md5(deal_key.encode()).hexdigest()
+            # The identifying fields themselves are the key; no digest needed for in-process dedup
+            deal_key = (deal['merchant'], deal['discount_percent'], deal['source'])
             
-            if deal_hash in unique_deals:
+            if deal_key in unique_deals:
                 duplicates += 1
             else:
-                unique_deals[deal_hash] = deal
+                unique_deals[deal_key] = deal
         
         print(f"✅ Unique deals: {len(unique_deals)}")
         print(f"🔄 Duplicates found: {duplicates}")
@@ -113,7 +109,6 @@ def test_bot_integration():
         return False
 
 if __name__ == "__main__":
-    import hashlib
     success = test_bot_integration()
     if success:
         print("\n🎉 Bot integration test completed successfully!")
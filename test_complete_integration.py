@@ -7,6 +7,7 @@ Tests the full pipeline: scraping -> filtering -> duplicate checking -> formatti
 import os
 import sys
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -16,9 +17,10 @@ load_dotenv()
 # Add current directory to path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from scraper import GiftCardScraper
-from database import DealDatabase
+from scraper import CardCashScraper, RaiseScraper, get_all_deals
+from database import get_database
 from main import GiftCardDealBot
+from pipeline import deals_at_least, PREMIUM_DISCOUNT
 
 # Configure logging
 logging.basicConfig(
@@ -32,7 +34,7 @@ def test_database_operations():
     print("🗄️  Testing Database Operations...")
     print("-" * 40)
     
-    db = DealDatabase()
+    db = get_database()  # Shared with the bot: one client, warm posted-hash caches
     
     # Test deal
     test_deal = {
@@ -64,19 +66,18 @@ def test_scraper_integration():
     print("\n🕷️  Testing Scraper Integration...")
     print("-" * 40)
     
-    scraper = GiftCardScraper()
-    
-    # Test individual scrapers
-    print("Testing CardCash scraper...")
-    cardcash_deals = scraper.scrape_cardcash_deals()
+    # Test individual scrapers; both are network-bound, so run them concurrently
+    print("Testing CardCash and GCX scrapers...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        cardcash_future = executor.submit(CardCashScraper().scrape)
+        gcx_future = executor.submit(RaiseScraper().scrape)
+        cardcash_deals = cardcash_future.result()
+        gcx_deals = gcx_future.result()
     print(f"✅ CardCash deals found: {len(cardcash_deals)}")
-    
-    print("Testing GCX scraper...")
-    gcx_deals = scraper.scrape_raise_deals()
     print(f"✅ GCX deals found: {len(gcx_deals)}")
     
-    # Test combined scraper
-    all_deals = scraper.get_all_deals()
+    # Test combined scraper (served from the scrape cache after the calls above)
+    all_deals = get_all_deals()
     print(f"✅ Total deals from all sources: {len(all_deals)}")
     
     return all_deals
@@ -96,7 +97,8 @@ def test_bot_integration():
     # Test deal filtering
     print("Filtering deals...")
     filtered_deals = bot.filter_deals(all_deals, min_discount=15.0)
-    premium_deals = bot.filter_deals(all_deals, min_discount=25.0)
+    # Premium deals are a subset of the new ≥15% deals, so one filter + duplicate check covers both
+    premium_deals = deals_at_least(filtered_deals, PREMIUM_DISCOUNT)
     
     print(f"✅ Filtered deals (≥15%): {len(filtered_deals)}")
     print(f"✅ Premium deals (≥25%): {len(premium_deals)}")
@@ -129,7 +131,7 @@ def test_duplicate_prevention():
     print("\n🔄 Testing Duplicate Prevention...")
     print("-" * 40)
     
-    db = DealDatabase()
+    db = get_database()
     
     # Create a test deal
     test_deal = {
@@ -10,6 +10,7 @@ import time
 import json
 import logging
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -24,7 +25,7 @@ from database_monitor import DatabaseDealMonitor
 from database_dashboard import DatabaseTurnoverDashboard
 from adaptive_scraper import AdaptiveScraper
 from scraper import get_all_deals
-from database import DealDatabase
+from database import get_database
 from services import telegram_service, geniuslink_service
 # from unified_monitor import UnifiedMonitor  # No longer needed
 
@@ -43,7 +44,7 @@ class DatabaseIntegrationTest:
         """Initialize test components"""
         self.test_mode = test_mode
         self.deal_bot = GiftCardDealBot()
-        self.db = DealDatabase()
+        self.db = get_database()  # Same instance as self.deal_bot.db
         self.db_monitor = DatabaseDealMonitor()
         self.db_dashboard = DatabaseTurnoverDashboard()
         self.adaptive_scraper = AdaptiveScraper()
@@ -72,8 +73,9 @@ class DatabaseIntegrationTest:
             # Quick monitoring to get data
             self.db_monitor.quick_analysis(samples=2, interval_minutes=base_interval)
             
-            # Wait between iterations
-            if i < iterations - 1:
+            # Wait between iterations (each quick analysis already spans several intervals,
+            # so test runs go straight into the next one)
+            if i < iterations - 1 and not self.test_mode:
                 logger.info(f"Waiting {base_interval} minutes before next iteration...")
                 time.sleep(base_interval * 60)
         
@@ -86,10 +88,19 @@ class DatabaseIntegrationTest:
         # Step 1: Run monitoring to collect data
         self.test_monitoring(duration_minutes=5, interval_minutes=1)
         
-        # Step 2: Run adaptive scraping based on monitoring data
-        self.test_adaptive_scraping(iterations=scraping_iterations)
+        # Steps 2 and 3 only depend on the monitoring data, not on each other, so they run side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Step 2: Run adaptive scraping based on monitoring data
+            adaptive = executor.submit(self.test_adaptive_scraping, iterations=scraping_iterations)
+            # Step 3: Process and optionally post deals
+            processing = executor.submit(self.test_deal_processing, post_deals=post_deals)
+            adaptive.result()
+            processing.result()
         
-        # Step 3: Process and optionally post deals
+        return True
+    
+    def test_deal_processing(self, post_deals=False):
+        """Process deals with the bot, posting them only when asked to"""
         if post_deals:
             logger.info("Processing and posting deals")
             self.deal_bot.process_deals()
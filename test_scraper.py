@@ -4,9 +4,18 @@ Test script to validate the web scraping functionality
 This helps debug and refine the scraping logic before full deployment
 """
 
+import os
+import heapq
 import logging
-from scraper import GiftCardScraper
+from concurrent.futures import ThreadPoolExecutor
+from scraper import CardCashScraper, RaiseScraper
 import json
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_results.json')
 
 # Configure detailed logging
 logging.basicConfig(
@@ -19,11 +28,14 @@ def test_scraper():
     print("🔍 Testing Gift Card Scraper...")
     print("=" * 50)
     
-    scraper = GiftCardScraper()
+    # Both sites are network-bound, so fetch them concurrently, then report each in turn
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        raise_future = executor.submit(RaiseScraper().scrape)
+        cardcash_future = executor.submit(CardCashScraper().scrape)
     
     # Test Raise.com scraping
     print("\n📊 Testing Raise.com scraping...")
-    raise_deals = scraper.scrape_raise_deals()
+    raise_deals = raise_future.result()
     print(f"Found {len(raise_deals)} deals from Raise.com")
     
     if raise_deals:
@@ -34,7 +46,7 @@ def test_scraper():
     
     # Test CardCash.com scraping
     print("\n💳 Testing CardCash.com scraping...")
-    cardcash_deals = scraper.scrape_cardcash_deals()
+    cardcash_deals = cardcash_future.result()
     print(f"Found {len(cardcash_deals)} deals from CardCash.com")
     
     if cardcash_deals:
@@ -47,23 +59,26 @@ def test_scraper():
     all_deals = raise_deals + cardcash_deals
     print(f"\n📈 Total deals found: {len(all_deals)}")
     
-    # Filter for high-discount deals
-    high_discount_deals = [deal for deal in all_deals if deal.get('discount_percent', 0) >= 15]
-    premium_deals = [deal for deal in all_deals if deal.get('discount_percent', 0) >= 25]
+    # Filter for high-discount deals; premium deals are a subset, so only rescan those
+    high_discount_deals = [deal for deal in all_deals if deal['discount_percent'] >= 15]
+    premium_deals = [deal for deal in high_discount_deals if deal['discount_percent'] >= 25]
     
     print(f"🎯 Deals with 15%+ discount: {len(high_discount_deals)}")
     print(f"⭐ Premium deals with 25%+ discount: {len(premium_deals)}")
     
     if high_discount_deals:
         print("\n🔥 Best deals (15%+ off):")
-        sorted_deals = sorted(high_discount_deals, key=lambda x: x.get('discount_percent', 0), reverse=True)
-        for i, deal in enumerate(sorted_deals[:5]):
+        best_deals = heapq.nlargest(5, high_discount_deals, key=lambda x: x['discount_percent'])
+        for i, deal in enumerate(best_deals):
             print(f"{i+1}. {deal['merchant']}: {deal['discount_percent']:.1f}% off (${deal['price']:.2f})")
     
     # Save results to file for inspection
     if all_deals:
-        with open('/Users/admin/CascadeProjects/telegram-deal-bot/test_results.json', 'w') as f:
-            json.dump(all_deals, f, indent=2, default=str)
+        with open(RESULTS_PATH, 'wb') as f:
+            if orjson is not None:
+                f.write(orjson.dumps(all_deals, option=orjson.OPT_INDENT_2))
+            else:
+                f.write(json.dumps(all_deals, indent=2).encode())
         print(f"\n💾 Full results saved to test_results.json")
     
     return all_deals
@@ -2,11 +2,16 @@
 """
 Test script to verify Telegram bot integration
 Run this after setting up your Telegram bot credentials
+
+Pass --yes (-y) to skip the confirmation prompts and send the regular and
+premium test messages concurrently (e.g. in CI).
 """
 
 import os
 import sys
+import asyncio
 import logging
+import argparse
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,7 +20,9 @@ load_dotenv()
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from config import get_config
 from main import GiftCardDealBot
+from services import telegram_service
 
 # Configure logging
 logging.basicConfig(
@@ -24,15 +31,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def test_telegram_connection():
-    """Test Telegram bot connection and message sending"""
+def test_telegram_connection(assume_yes=False):
+    """Test Telegram bot connection and message sending (assume_yes: send without prompting)"""
     print("📱 Testing Telegram Bot Connection...")
     print("=" * 50)
     
-    # Check if credentials are available
-    bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-    channel_id = os.getenv('TELEGRAM_CHANNEL_ID')
-    premium_channel_id = os.getenv('TELEGRAM_PREMIUM_CHANNEL_ID')
+    # Check if credentials are available (the same cached config the bot sends with)
+    config = get_config()
+    bot_token = config.telegram_bot_token
+    channel_id = config.telegram_channel_id
+    premium_channel_id = config.telegram_premium_channel_id
     
     if not bot_token:
         print("❌ TELEGRAM_BOT_TOKEN not found in environment variables")
@@ -62,6 +70,9 @@ def test_telegram_connection():
         'url': 'https://example.com/test-deal'
     }
     
+    # (message, channel_id, label) sent together at the end when prompts are skipped
+    unattended_sends = []
+    
     # Test regular message
     print("\n📤 Testing regular message...")
     regular_message = bot.format_deal_message(test_deal, is_premium=False)
@@ -71,9 +82,11 @@ def test_telegram_connection():
     print("-" * 30)
     
     # Ask for confirmation before sending
-    response = input("\nSend this test message to your channel? (y/n): ").lower().strip()
-    if response == 'y':
-        success = bot.send_telegram_message(regular_message)
+    if assume_yes:
+        unattended_sends.append((regular_message, channel_id, "Regular"))
+    elif input("\nSend this test message to your channel? (y/n): ").lower().strip() == 'y':
+        # Both test sends go over the service's keep-alive HTTP/2 connection to api.telegram.org
+        success = telegram_service.send_message(regular_message, channel_id)
         if success:
             print("✅ Regular message sent successfully!")
         else:
@@ -91,9 +104,10 @@ def test_telegram_connection():
         print(premium_message)
         print("-" * 30)
         
-        response = input("\nSend this test message to your premium channel? (y/n): ").lower().strip()
-        if response == 'y':
-            success = bot.send_telegram_message(premium_message, premium_channel_id)
+        if assume_yes:
+            unattended_sends.append((premium_message, premium_channel_id, "Premium"))
+        elif input("\nSend this test message to your premium channel? (y/n): ").lower().strip() == 'y':
+            success = telegram_service.send_message(premium_message, premium_channel_id)
             if success:
                 print("✅ Premium message sent successfully!")
             else:
@@ -102,17 +116,34 @@ def test_telegram_connection():
         else:
             print("⏭️  Skipping premium message test")
     
+    # Without prompts in between, both messages go out concurrently over one connection
+    if unattended_sends:
+        results = asyncio.run(telegram_service.send_messages_async(
+            [(message, target) for message, target, _ in unattended_sends]
+        ))
+        for (_, _, label), result in zip(unattended_sends, results):
+            if result is True:
+                print(f"✅ {label} message sent successfully!")
+            else:
+                print(f"❌ Failed to send {label.lower()} message")
+                return False
+    
     print("\n🎉 Telegram integration test completed!")
     return True
 
 def main():
     """Main test function"""
+    parser = argparse.ArgumentParser(description='Test Telegram bot integration')
+    parser.add_argument('-y', '--yes', action='store_true',
+                      help='Send the test messages without asking for confirmation')
+    args = parser.parse_args()
+    
     print("🚀 Telegram Bot Integration Test")
     print("This will test your Telegram bot setup and send test messages")
     print("Make sure you have set up your .env file with Telegram credentials\n")
     
     try:
-        success = test_telegram_connection()
+        success = test_telegram_connection(assume_yes=args.yes)
         
         if success:
             print("\n✅ All tests passed! Your Telegram bot is ready.")